@@ -0,0 +1,244 @@
+"""
+Benchmark of TnsApi and tnscm CLI subcommands against mock Nessus API.
+
+Starts benchmarks/mockserver.py in separate process and reports latency,
+requests per second and peak memory of each TnsApi method and each CLI
+subcommand. TnsApi peak is memory allocated by Python during calls
+(tracemalloc), CLI peak is max RSS of the tnscm process.
+
+    python benchmarks/api.py
+    python benchmarks/api.py --hosts 5 --items 5000 --latency 0.02 --runs 3
+    python benchmarks/api.py --json > results.json
+"""
+
+import argparse
+import json
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tnscm.modules.tnsapi import TnsApi  # noqa: E402
+
+METHODS = [
+    "server_status_get",
+    "server_properties_get",
+    "users_get",
+    "policies_get",
+    "scans_get",
+    "plugins_families_get",
+    "settings_advanced_get",
+]
+
+# measured also with stream=True
+STREAM_METHODS = ["users_get", "policies_get", "scans_get"]
+
+COMMANDS = [
+    ["server", "--status", "--ips", "--version"],
+    ["user", "--list"],
+    ["policy", "--list"],
+    ["scan", "--list"],
+    ["plugin", "--family-list"],
+    ["settings", "--list"],
+]
+
+
+class MockProcess:
+
+    def __init__(self, hosts, items, latency):
+        """
+        benchmarks/mockserver.py running in separate process, so it does
+        not disturb memory and time measured here.
+        """
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(ROOT, "benchmarks", "mockserver.py"),
+                "--hosts",
+                str(hosts),
+                "--items",
+                str(items),
+                "--latency",
+                str(latency),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        line = self.process.stdout.readline()
+        if not line:
+            self.process.wait()
+            raise RuntimeError("Mock Nessus API did not start.")
+        started = json.loads(line)
+        self.addresses = started["addresses"]
+        self.port = started["port"]
+
+    def requests_served(self):
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        url = "https://{}:{}/_stats".format(self.addresses[0], self.port)
+        with urllib.request.urlopen(url, context=context) as r:
+            return json.loads(r.read())["requests"]
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def api_measure(mock, method, runs, stream=False):
+    """
+    Call TnsApi method on every host `runs` times, memoization is disabled
+    so each call is sent to mock.
+
+    :param stream: if True call method with stream=True and take items of
+                   returned generator one by one
+    """
+    connections = []
+    for address in mock.addresses:
+        tnscon = TnsApi(address, mock.port, insecure=True, memoize=False)
+        tnscon.login("admin", "admin")
+        connections.append(tnscon)
+
+    timings = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(runs):
+        for tnscon in connections:
+            call_start = time.perf_counter()
+            if stream:
+                for _ in getattr(tnscon, method)(stream=True):
+                    pass
+            else:
+                getattr(tnscon, method)()
+            timings.append((time.perf_counter() - call_start) * 1000)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    for tnscon in connections:
+        tnscon.logout()
+        tnscon.close()
+
+    return {
+        "name": "TnsApi.{}{}".format(method, "(stream=True)" if stream else ""),
+        "median_ms": statistics.median(timings),
+        "requests_per_second": len(timings) / elapsed,
+        "peak_mb": peak / 2**20,
+    }
+
+
+def process_run(args, env):
+    """
+    Run process and return its max RSS in MB, None if OS does not report it.
+    """
+    process = subprocess.Popen(
+        args, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return None
+
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args)
+    # bytes on macOS, kilobytes elsewhere
+    divider = 2**20 if sys.platform == "darwin" else 2**10
+    return usage.ru_maxrss / divider
+
+
+def cli_measure(mock, command, runs, format, parallel):
+    args = [sys.executable, "-m", "tnscm"] + command
+    for address in mock.addresses:
+        args += ["--address", address]
+    args += ["--port", str(mock.port), "-u", "admin", "-p", "admin", "-k"]
+    args += ["--format", format, "--parallel", str(parallel)]
+
+    env = dict(os.environ)
+    # password given with -p must not be stored in OS Credential Manager
+    env["PYTHON_KEYRING_BACKEND"] = "keyring.backends.null.Keyring"
+
+    timings = []
+    peaks = []
+    requests_sent = 0
+    for _ in range(runs):
+        served = mock.requests_served()
+        start = time.perf_counter()
+        peaks.append(process_run(args, env))
+        timings.append((time.perf_counter() - start) * 1000)
+        requests_sent += mock.requests_served() - served
+
+    return {
+        "name": "tnscm {}".format(" ".join(command)),
+        "median_ms": statistics.median(timings),
+        "requests_per_second": requests_sent / (sum(timings) / 1000),
+        "peak_mb": None if None in peaks else max(peaks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=1, help="number of mock hosts")
+    parser.add_argument("--items", type=int, default=1000, help="items per list")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds before each response"
+    )
+    parser.add_argument("--runs", type=int, default=5, help="runs per measurement")
+    parser.add_argument(
+        "--format", default="csv", help="--format of CLI subcommands `csv`"
+    )
+    parser.add_argument(
+        "--parallel", type=int, default=1, help="--parallel of CLI subcommands `1`"
+    )
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    options = parser.parse_args()
+
+    mock = MockProcess(options.hosts, options.items, options.latency)
+    try:
+        results = [api_measure(mock, method, options.runs) for method in METHODS]
+        results += [
+            api_measure(mock, method, options.runs, stream=True)
+            for method in STREAM_METHODS
+        ]
+        results += [
+            cli_measure(mock, command, options.runs, options.format, options.parallel)
+            for command in COMMANDS
+        ]
+    finally:
+        mock.stop()
+
+    if options.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        "hosts: {}, items: {}, latency: {} s, runs: {}\n".format(
+            options.hosts, options.items, options.latency, options.runs
+        )
+    )
+    print(
+        "{:<44} {:>10} {:>10} {:>10}".format("command", "median ms", "req/s", "peak MB")
+    )
+    for result in results:
+        peak = (
+            "n/a" if result["peak_mb"] is None else "{:.1f}".format(result["peak_mb"])
+        )
+        print(
+            "{:<44} {:>10.1f} {:>10.1f} {:>10}".format(
+                result["name"],
+                result["median_ms"],
+                result["requests_per_second"],
+                peak,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
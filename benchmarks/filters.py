@@ -0,0 +1,157 @@
+"""
+Benchmark of JMESPath filters on large synthetic scan lists.
+
+Checks first that fast path of tnscm.modules.filterplan returns the same
+as jmespath for README example filters and edge cases, then compares time
+of both on scan list of given size.
+
+    python benchmarks/filters.py
+    python benchmarks/filters.py --rows 100000 --runs 3
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jmespath  # noqa: E402
+from tnscm.modules import filterplan  # noqa: E402
+
+FILTERS = [
+    "[] | [0]",
+    "[].{id: id, name: name}",
+    "sort_by([], &id)[].{id: id, name: name}",
+    "sort_by([], &name)[].{id: id, name: name}",
+    "[? contains(name, 'exampl')].{id: id, name: name}",
+    "[? contains(name, 'exampl1') || contains(name, 'exampl2')].{id: id, name: name}",
+    "[?id==`10`].{id: id, name: name}",
+    "[?name == 'test name'].{id: id, name: name}",
+    "[?name != 'test name'].{id: id, name: name}",
+    "[].{folder_id: folder_id, id: id, name: name, owner: owner, "
+    "creation_date: creation_date, last_modification_date: last_modification_date, "
+    "status: status}",
+    "[?status == 'running'].[id, name]",
+    "[?last_modification_date > `1700000000` && !shared].id",
+    "[? starts_with(owner, 'user1')].{id: id, owner: owner}",
+    "[].id",
+    "[]",
+]
+
+# filters which jmespath rejects or which have special semantics
+EDGE_FILTERS = FILTERS + [
+    "[?enabled == `1`].id",
+    "[?enabled == `true`].id",
+    "[?!shared].id",
+    "[?folder_id].id",
+    "sort_by([], &folder_id)[].id",
+    "[?contains(owner, 'user')].id",
+    "[?name > `1`].id",
+    "[].{a: id, b: @.name}",
+    "[*].id",
+]
+
+STATUSES = ["completed", "running", "canceled", "imported", "empty"]
+
+
+def scans_generate(rows, seed=1):
+    generator = random.Random(seed)
+    scans = []
+    for id in range(rows):
+        scans.append(
+            {
+                "folder_id": generator.randint(1, 5),
+                "id": generator.randint(1, rows * 10),
+                "name": "exampl{} scan {}".format(generator.randint(0, 20), id),
+                "owner": "user{}".format(generator.randint(0, 50)),
+                "creation_date": 1600000000 + generator.randint(0, 10**8),
+                "last_modification_date": 1600000000 + generator.randint(0, 10**8),
+                "status": generator.choice(STATUSES),
+                "shared": generator.random() < 0.2,
+                "enabled": generator.choice([True, False, 1, 0]),
+                "uuid": "template-{:032x}".format(generator.getrandbits(128)),
+            }
+        )
+    return scans
+
+
+def scans_edge_cases():
+    return [
+        {"id": 1, "name": None, "owner": 5, "folder_id": None},
+        {"id": 2, "name": "exampl1", "owner": "user1", "folder_id": "3"},
+        {"id": 10, "name": "test name", "enabled": True, "shared": 0},
+        None,
+        7,
+        [{"id": 3, "name": "nested exampl2"}],
+        {"name": "no id", "last_modification_date": "1700000001"},
+    ]
+
+
+def outcome(function, data):
+    try:
+        return ("ok", function(data))
+    except Exception as e:
+        return ("error", type(e).__name__)
+
+
+def parity_check(data, filters):
+    failures = []
+    for expression in filters:
+        expected = outcome(jmespath.compile(expression).search, data)
+        actual = outcome(filterplan.compile(expression).search, data)
+        if expected != actual:
+            failures.append(expression)
+    return failures
+
+
+def timed(function, data, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="number of scans")
+    parser.add_argument("--runs", type=int, default=3, help="runs per filter")
+    options = parser.parse_args()
+
+    failures = parity_check(scans_edge_cases(), EDGE_FILTERS)
+    failures += parity_check(scans_generate(1000), EDGE_FILTERS)
+    if failures:
+        print("Fast path differs from jmespath for:")
+        for expression in failures:
+            print("  {}".format(expression))
+        sys.exit(1)
+    print("Parity with jmespath: {} filters OK\n".format(len(EDGE_FILTERS)))
+
+    scans = scans_generate(options.rows)
+    print(
+        "{:<60} {:>5} {:>12} {:>12} {:>8}".format(
+            "filter", "fast", "jmespath ms", "tnscm ms", "speedup"
+        )
+    )
+    for expression in FILTERS:
+        expected = jmespath.compile(expression)
+        planned = filterplan.compile(expression)
+        jmespath_ms = timed(expected.search, scans, options.runs)
+        planned_ms = timed(planned.search, scans, options.runs)
+        print(
+            "{:<60} {:>5} {:>12.1f} {:>12.1f} {:>7.1f}x".format(
+                expression[:60],
+                "yes" if planned.fast else "no",
+                jmespath_ms,
+                planned_ms,
+                jmespath_ms / planned_ms if planned_ms else 0,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
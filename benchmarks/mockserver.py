@@ -0,0 +1,473 @@
+"""
+Mock Nessus API served over HTTPS with self-signed certificate.
+
+Serves `/session`, `/scans`, `/policies`, `/users`, `/server/status`,
+`/server/properties`, `/plugins/families` and `/settings/advanced` with
+generated data (`/scans?last_modification_date=` returns only scans
+changed since then, `/scans/{id}` returns details and history of scan),
+so tnscm can be measured without real Nessus scanner.
+Scan exports are ready `--export-seconds` after they are requested and
+have `--export-bytes` of data. With `--error-rate` part of requests is
+answered with 503, like by overloaded scanner.
+Each host is a separate server on its own loopback address (127.0.0.1,
+127.0.0.2, ...) and the same port, as tnscm uses one `--port` for all
+addresses. Number of requests served is available at `/_stats`.
+On macOS addresses other than 127.0.0.1 have to be added first, e.g.
+`sudo ifconfig lo0 alias 127.0.0.2`.
+
+    python benchmarks/mockserver.py --hosts 3 --items 1000 --latency 0.05
+
+Certificate is created with `openssl` command line tool.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+TOKEN = "mock-token"
+
+STATUSES = ["completed", "running", "canceled", "imported", "empty"]
+
+
+def certificate_create(directory):
+    """
+    Create self-signed certificate and key for 127.0.0.1.
+
+    :return: certfile, keyfile
+    """
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=127.0.0.1",
+            "-keyout",
+            keyfile,
+            "-out",
+            certfile,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return certfile, keyfile
+
+
+def resources_generate(items, seed=1):
+    """
+    Responses of Nessus API with given number of items in each list.
+    """
+    generator = random.Random(seed)
+
+    scans = [
+        {
+            "folder_id": generator.randint(1, 5),
+            "id": id,
+            "name": "scan {}".format(id),
+            "owner": "user{}".format(generator.randint(0, 50)),
+            "creation_date": 1600000000 + generator.randint(0, 10**8),
+            "last_modification_date": 1600000000 + generator.randint(0, 10**8),
+            "status": generator.choice(STATUSES),
+            "shared": generator.random() < 0.2,
+            "enabled": generator.random() < 0.5,
+            "read": True,
+            "rrules": None,
+            "timezone": None,
+            "starttime": None,
+            "control": True,
+            "type": "remote",
+            "user_permissions": 128,
+            "uuid": "template-{:032x}".format(generator.getrandbits(128)),
+        }
+        for id in range(1, items + 1)
+    ]
+    policies = [
+        {
+            "id": id,
+            "name": "policy {}".format(id),
+            "owner": "user{}".format(generator.randint(0, 50)),
+            "creation_date": 1600000000 + generator.randint(0, 10**8),
+            "last_modification_date": 1600000000 + generator.randint(0, 10**8),
+            "description": None,
+            "visibility": "private",
+            "shared": 0,
+            "user_permissions": 128,
+            "template_uuid": "{:032x}".format(generator.getrandbits(128)),
+        }
+        for id in range(1, items + 1)
+    ]
+    users = [
+        {
+            "id": id,
+            "username": "user{}".format(id),
+            "name": "User {}".format(id),
+            "email": "user{}@example.com".format(id),
+            "permissions": 128,
+            "type": "local",
+            "login_fail_count": 0,
+            "lastlogin": (
+                None if id % 10 == 0 else 1600000000 + generator.randint(0, 10**8)
+            ),
+        }
+        for id in range(1, items + 1)
+    ]
+    families = [
+        {"id": id, "name": "Family {}".format(id), "count": generator.randint(1, 9999)}
+        for id in range(1, items + 1)
+    ]
+    preferences = [
+        {"id": "setting_{}".format(id), "name": "setting_{}".format(id), "value": "yes"}
+        for id in range(1, items + 1)
+    ]
+
+    return {
+        "/server/status": {"status": "ready", "progress": None},
+        "/server/properties": {
+            "nessus_type": "Nessus Manager",
+            "server_version": "10.8.0",
+            "used_ip_count": 128,
+            "license": {"ips": 512, "type": "manager"},
+        },
+        "/scans": {"folders": [], "scans": scans, "timestamp": 1700000000},
+        "/policies": {"policies": policies},
+        "/users": {"users": users},
+        "/plugins/families": {"families": families},
+        "/settings/advanced": {"preferences": preferences},
+    }
+
+
+class Stats:
+
+    def __init__(self):
+        """
+        Number of requests served by all mock hosts.
+        """
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def request_served(self):
+        with self._lock:
+            self.requests += 1
+
+
+class Exports:
+
+    def __init__(self, seconds, size):
+        """
+        Scan exports requested from all mock hosts.
+
+        :param seconds: seconds after which export is ready
+        :param size: size of exported file in bytes
+        """
+        self.seconds = seconds
+        self.size = size
+        self.ready_at = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def request(self):
+        with self._lock:
+            file_id = next(self._counter)
+            self.ready_at[file_id] = time.monotonic() + self.seconds
+        return file_id
+
+    def status(self, file_id):
+        ready_at = self.ready_at.get(file_id)
+        if ready_at is None:
+            return None
+        return "ready" if time.monotonic() >= ready_at else "loading"
+
+
+def handler_get(bodies, latency, stats, exports, error_rate=0.0):
+    """
+    Request handler class serving given encoded responses.
+
+    :param bodies: dict with resource as key and JSON as bytes as value
+    :param latency: seconds to wait before each response
+    :param stats: Stats shared by all hosts
+    :param exports: Exports shared by all hosts
+    :param error_rate: part of requests answered with 503
+    """
+
+    scans = json.loads(bodies["/scans"])
+
+    def scans_changed(since):
+        changed = [
+            scan for scan in scans["scans"] if scan["last_modification_date"] >= since
+        ]
+        body = dict(scans, scans=changed or None)
+        return json.dumps(body).encode()
+
+    scans_by_id = {scan["id"]: scan for scan in scans["scans"]}
+
+    def scan_details(scan_id):
+        scan = scans_by_id.get(scan_id)
+        if scan is None:
+            return None
+        start = scan["creation_date"]
+        end = max(start, scan["last_modification_date"])
+        body = {
+            "info": {
+                "name": scan["name"],
+                "status": scan["status"],
+                "policy": "Basic Network Scan",
+                "targets": "192.168.{}.0/24".format(scan_id % 256),
+                "hostcount": scan_id % 254 + 1,
+                "scan_start": start,
+                "scan_end": end,
+            },
+            "hosts": [],
+            "history": [
+                {
+                    "history_id": scan_id * 10 + number,
+                    "status": "completed",
+                    "creation_date": start + number * 86400,
+                    "last_modification_date": start + number * 86400 + 3600,
+                }
+                for number in range(scan_id % 5)
+            ],
+        }
+        return json.dumps(body).encode()
+
+    class MockNessusHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def respond(self, status_code, body=b""):
+            if latency:
+                time.sleep(latency)
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def body_read(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length)
+
+        def overloaded(self):
+            if error_rate and random.random() < error_rate:
+                self.respond(503, b'{"error": "Service Unavailable"}')
+                return True
+            return False
+
+        def authorized(self):
+            return "token={}".format(TOKEN) in self.headers.get("X-Cookie", "")
+
+        def do_POST(self):
+            self.body_read()
+            stats.request_served()
+            if self.overloaded():
+                return
+            if self.path == "/session":
+                return self.respond(200, json.dumps({"token": TOKEN}).encode())
+            if not self.authorized():
+                return self.respond(401, b'{"error": "Invalid Credentials"}')
+            if re.fullmatch(r"/scans/\d+/export", self.path):
+                body = {"file": exports.request(), "token": TOKEN}
+                return self.respond(200, json.dumps(body).encode())
+            self.respond(404, b'{"error": "The requested file was not found."}')
+
+        def do_DELETE(self):
+            self.body_read()
+            stats.request_served()
+            if self.overloaded():
+                return
+            if not self.authorized():
+                return self.respond(401, b'{"error": "Invalid Credentials"}')
+            self.respond(200)
+
+        def do_GET(self):
+            self.body_read()
+            resource = self.path.split("?")[0]
+            if resource == "/_stats":
+                body = json.dumps({"requests": stats.requests}).encode()
+                return self.respond(200, body)
+
+            stats.request_served()
+            if self.overloaded():
+                return
+            if not self.authorized():
+                return self.respond(401, b'{"error": "Invalid Credentials"}')
+            if resource == "/session":
+                return self.respond(200, b'{"username": "admin"}')
+            since = parse_qs(urlsplit(self.path).query).get("last_modification_date")
+            if resource == "/scans" and since:
+                return self.respond(200, scans_changed(int(since[0])))
+            if resource in bodies:
+                return self.respond(200, bodies[resource])
+
+            match = re.fullmatch(r"/scans/(\d+)", resource)
+            details = match and scan_details(int(match.group(1)))
+            if details:
+                return self.respond(200, details)
+
+            match = re.fullmatch(r"/scans/\d+/export/(\d+)/(status|download)", resource)
+            status = match and exports.status(int(match.group(1)))
+            if match and match.group(2) == "status" and status:
+                return self.respond(200, json.dumps({"status": status}).encode())
+            if match and status == "ready":
+                return self.file_send(exports.size)
+            self.respond(404, b'{"error": "The requested file was not found."}')
+
+        def file_send(self, size, chunk_size=64 * 1024):
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            chunk = b"x" * chunk_size
+            while size > 0:
+                self.wfile.write(chunk[:size])
+                size -= chunk_size
+
+    return MockNessusHandler
+
+
+class MockNessus:
+
+    def __init__(
+        self,
+        hosts=1,
+        port=0,
+        items=100,
+        latency=0.0,
+        export_seconds=1.0,
+        export_bytes=10 * 2**20,
+        error_rate=0.0,
+        directory=None,
+    ):
+        """
+        Mock Nessus API on `hosts` loopback addresses and one port.
+
+        :param hosts: number of mock Nessus hosts `1`
+        :param port: port on which all hosts listen, `0` picks free one
+        :param items: number of scans, policies, users, plugin families and
+                      advanced settings returned by each host `100`
+        :param latency: seconds to wait before each response `0.0`
+        :param export_seconds: seconds after which scan export is ready `1.0`
+        :param export_bytes: size of exported scan file `10 MiB`
+        :param error_rate: part of requests answered with 503 `0.0`
+        :param directory: where certificate is stored, temporary if not given
+        """
+        self.stats = Stats()
+        self._directory = None
+        if directory is None:
+            self._directory = tempfile.TemporaryDirectory()
+            directory = self._directory.name
+        self.certfile, self.keyfile = certificate_create(directory)
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.certfile, self.keyfile)
+
+        bodies = {
+            resource: json.dumps(data).encode()
+            for resource, data in resources_generate(items).items()
+        }
+        self.exports = Exports(export_seconds, export_bytes)
+        handler = handler_get(bodies, latency, self.stats, self.exports, error_rate)
+
+        self.servers = []
+        for number in range(1, hosts + 1):
+            address = "127.0.0.{}".format(number)
+            server = ThreadingHTTPServer((address, port), handler)
+            server.daemon_threads = True
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+            # all hosts use port picked for the first one
+            port = server.server_address[1]
+            self.servers.append(server)
+
+        self.port = port
+        self.addresses = [server.server_address[0] for server in self.servers]
+        self._threads = []
+
+    def start(self):
+        for server in self.servers:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join()
+        if self._directory is not None:
+            self._directory.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=1, help="number of hosts")
+    parser.add_argument("--port", type=int, default=0, help="port, 0 picks free one")
+    parser.add_argument("--items", type=int, default=100, help="items per list")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds before each response"
+    )
+    parser.add_argument(
+        "--export-seconds",
+        type=float,
+        default=1.0,
+        help="seconds after which scan export is ready",
+    )
+    parser.add_argument(
+        "--export-bytes",
+        type=int,
+        default=10 * 2**20,
+        help="size of exported scan file",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="part of requests answered with 503, e.g. 0.1",
+    )
+    options = parser.parse_args()
+
+    mock = MockNessus(
+        options.hosts,
+        options.port,
+        options.items,
+        options.latency,
+        options.export_seconds,
+        options.export_bytes,
+        options.error_rate,
+    )
+    mock.start()
+    # first line is read by benchmarks/api.py to know where mock listens
+    print(json.dumps({"addresses": mock.addresses, "port": mock.port}), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Benchmark of memory held by lists as dicts and as tnscm.modules.records.
+
+Lists are decoded from the same JSON as mock Nessus API returns, so dicts
+are the ones TnsApi gives. Checks first that records are turned back into
+equal dicts with the same order of keys, then reports memory held by each
+list (tracemalloc) and time to pack it and to filter it with default
+filter of the CLI, as dicts and as records.
+
+    python benchmarks/records.py
+    python benchmarks/records.py --items 100000 --runs 3
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mockserver import resources_generate  # noqa: E402
+from tnscm.modules import filterplan  # noqa: E402
+from tnscm.modules import records  # noqa: E402
+
+# TnsApi method, resource, key of the list and default filter of the CLI
+ENTITIES = [
+    (
+        "scans_get",
+        "/scans",
+        "scans",
+        "[].{folder_id: folder_id, id: id, name: name, owner: owner, "
+        "creation_date: creation_date, last_modification_date: "
+        "last_modification_date, status: status}",
+    ),
+    (
+        "policies_get",
+        "/policies",
+        "policies",
+        "[].{id: id, name: name, owner: owner, creation_date: creation_date, "
+        "last_modification_date: last_modification_date}",
+    ),
+    (
+        "users_get",
+        "/users",
+        "users",
+        "[].{id: id, username: username, name: name, lastlogin: lastlogin}",
+    ),
+    (
+        "plugins_families_get",
+        "/plugins/families",
+        "families",
+        "[].{id: id, name: name, count: count}",
+    ),
+]
+
+
+def held(function):
+    """
+    Bytes allocated by function and still held by what it returns.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        value = function()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return value, size
+
+
+def timed(function, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def parity_check(method, items):
+    unpacked = records.unpack(records.pack(method, items))
+    return unpacked == items and [list(item) for item in unpacked] == [
+        list(item) for item in items
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=50000, help="items per list")
+    parser.add_argument("--runs", type=int, default=3, help="runs of each timing")
+    options = parser.parse_args()
+
+    resources = resources_generate(options.items)
+    texts = {
+        resource: json.dumps(resources[resource]) for _, resource, _, _ in ENTITIES
+    }
+    del resources
+
+    failures = []
+    for method, resource, key, _ in ENTITIES:
+        items = json.loads(texts[resource])[key][:1000]
+        # keys which have no slot and items with missing keys
+        items[0]["not_known"] = {"nested": [1, 2]}
+        del items[1]["name"]
+        if not parity_check(method, items):
+            failures.append(method)
+    if failures:
+        print("Records differ from dicts for:")
+        for method in failures:
+            print("  {}".format(method))
+        sys.exit(1)
+    print("Parity with dicts: {} entities OK\n".format(len(ENTITIES)))
+
+    print(
+        "{:<22} {:>10} {:>12} {:>8} {:>9} {:>11} {:>13}".format(
+            "entity",
+            "dicts MB",
+            "records MB",
+            "saved",
+            "pack ms",
+            "filter ms",
+            "unpack+filter",
+        )
+    )
+    for method, resource, key, default_filter in ENTITIES:
+        text = texts[resource]
+        items, dicts_size = held(lambda: json.loads(text)[key])
+        packed, records_size = held(lambda: records.pack(method, json.loads(text)[key]))
+        expression = filterplan.compile(default_filter)
+        if expression.search(items) != expression.search(records.unpack(packed)):
+            print("Filtered records differ from dicts for {}".format(method))
+            sys.exit(1)
+
+        pack_ms = timed(lambda: records.pack(method, items), options.runs)
+        filter_ms = timed(lambda: expression.search(items), options.runs)
+        unpack_ms = timed(
+            lambda: expression.search(records.unpack(packed)), options.runs
+        )
+        print(
+            "{:<22} {:>10.1f} {:>12.1f} {:>7.0f}% {:>9.1f} {:>11.1f} {:>13.1f}".format(
+                method,
+                dicts_size / 2**20,
+                records_size / 2**20,
+                100 - records_size * 100 / dicts_size if dicts_size else 0,
+                pack_ms,
+                filter_ms,
+                unpack_ms,
+            )
+        )
+        del items, packed
+
+
+if __name__ == "__main__":
+    main()
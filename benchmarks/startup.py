@@ -0,0 +1,71 @@
+"""
+Cold start benchmark of tnscm CLI.
+
+Runs `python -m tnscm` with arguments which do not talk to any Nessus server
+in fresh processes and reports best and median wall time of each.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20 --max-ms 300
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = [
+    ["--help"],
+    ["-v"],
+    ["server", "--help"],
+    ["user", "--help"],
+    ["policy", "--help"],
+    ["scan", "--help"],
+    ["plugin", "--help"],
+    ["settings", "--help"],
+]
+
+
+def measure(args, runs):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "tnscm"] + args,
+            cwd=root,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return min(timings), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="runs per command")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="exit with error if median of any command is above this number",
+    )
+    options = parser.parse_args()
+
+    slow = []
+    print("{:<20} {:>10} {:>10}".format("command", "best ms", "median ms"))
+    for args in COMMANDS:
+        best, median = measure(args, options.runs)
+        print("{:<20} {:>10.1f} {:>10.1f}".format(" ".join(args), best, median))
+        if options.max_ms and median > options.max_ms:
+            slow.append(" ".join(args))
+
+    if slow:
+        print("Slower than {} ms: {}".format(options.max_ms, ", ".join(slow)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
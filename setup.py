@@ -22,6 +22,7 @@ setuptools.setup(
     url="https://github.com/LimberDuck/tnscm",
     packages=setuptools.find_packages(),
     install_requires=required,
+    extras_require={"yaml": ["PyYAML>=6.0"]},
     entry_points={"console_scripts": ["tnscm = tnscm.__main__:main"]},
     classifiers=[
         "Programming Language :: Python :: 3.13",
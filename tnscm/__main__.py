@@ -1,31 +1,84 @@
 from tnscm._version import __version__
-from tnscm.modules.tnsapi import TnsApi
+from tnscm.modules import apierrors
+from tnscm.modules import bulkdelete
+from tnscm.modules import diskcache
+from tnscm.modules import filterplan
+from tnscm.modules import records
+from tnscm.modules import results
+from tnscm.modules import scandetails
+from tnscm.modules import scanexport
+from tnscm.modules import scansync
+from tnscm.modules import sessionstore
+from tnscm.modules import timestamps
+from tnscm.modules import tracing
+from tnscm.modules import writers
 import click
-import pandas as pd
-from tabulate import tabulate
+import copy
 import getpass
-import keyring
-from keyring.backends import Windows, macOS
+import os
 import platform
+import signal
 import sys
-from oauthlib.oauth2.rfc6749.errors import CustomOAuth2Error
-import datetime
-import jmespath
 from tnscm import utilities
 from tnscm import __about__
 
+# heavy modules are loaded on first use, so --help and --version stay fast
+fleet = utilities.lazy_import("tnscm.modules.fleet")
+daemon = utilities.lazy_import("tnscm.modules.daemon")
+inventory = utilities.lazy_import("tnscm.modules.inventory")
+hostsfile = utilities.lazy_import("tnscm.modules.hostsfile")
+credentials = utilities.lazy_import("tnscm.modules.credentials")
+shards = utilities.lazy_import("tnscm.modules.shards")
+pd = utilities.lazy_import("pandas")
+tabulate = utilities.lazy_import("tabulate")
+keyring = utilities.lazy_import("keyring")
+
 os_user = getpass.getuser().lower()
 
-if platform.system() == "Windows":
-    keyring.set_keyring(Windows.WinVaultKeyring())
-elif platform.system() == "Darwin":
-    keyring.set_keyring(macOS.Keyring())
+_vault_ready = False
+
+
+def vault_init():
+    global _vault_ready
+    if _vault_ready:
+        return
+
+    if platform.system() == "Windows":
+        from keyring.backends import Windows
+
+        keyring.set_keyring(Windows.WinVaultKeyring())
+    elif platform.system() == "Darwin":
+        from keyring.backends import macOS
+
+        keyring.set_keyring(macOS.Keyring())
+
+    _vault_ready = True
 
 
-_login_options = [
+class ConnectionOption(click.Option):
+    """
+    Option which is not prompted for when hosts are given with --hosts-file.
+    """
+
+    def prompt_for_value(self, ctx):
+        if ctx.params.get("hosts_file"):
+            # only addresses given with --address are added to the file
+            return () if self.multiple else self.get_default(ctx)
+        return super().prompt_for_value(ctx)
+
+
+_connection_options = [
+    click.option(
+        "--hosts-file",
+        is_eager=True,
+        type=click.Path(exists=True, dir_okay=False),
+        help="YAML or CSV file with hosts, each one can have own port, "
+        "username, credential (env:VARIABLE or keyring[:SERVICE]) and insecure",
+    ),
     click.option(
         "--address",
         "-a",
+        cls=ConnectionOption,
         default=["127.0.0.1"],
         multiple=True,
         prompt="address",
@@ -41,6 +94,7 @@ _login_options = [
     click.option(
         "--username",
         "-u",
+        cls=ConnectionOption,
         default=os_user,
         prompt="username",
         help="username which you want to use to login",
@@ -53,11 +107,15 @@ _login_options = [
         is_flag=True,
         help="perform insecure SSL connections and transfers",
     ),
+]
+
+_login_options = _connection_options + [
     click.option(
         "--format",
         "-f",
         default="table",
-        help="data format to display [table,json,csv]",
+        type=click.Choice(writers.FORMATS),
+        help="data format to display",
         show_default="table",
     ),
     click.option(
@@ -67,7 +125,135 @@ _login_options = [
     ),
 ]
 
-_general_options = [click.option("-v", "--verbose", count=True)]
+_general_options = [
+    click.option("-v", "--verbose", count=True),
+    click.option(
+        "--parallel",
+        default=1,
+        type=click.IntRange(min=1),
+        help="number of servers to talk to at the same time",
+        show_default="1",
+    ),
+    click.option(
+        "--engine",
+        default="threads",
+        type=click.Choice(["threads", "asyncio"]),
+        help="how to talk to many servers at the same time, "
+        "asyncio is used only for commands which do not delete and "
+        "when no server is reached through HTTPS_PROXY",
+        show_default="threads",
+    ),
+    click.option(
+        "--reuse-session",
+        is_flag=True,
+        help="keep Nessus session open after run and reuse it next time "
+        "instead of login and logout",
+    ),
+    click.option(
+        "--retries",
+        default=0,
+        type=click.IntRange(min=0),
+        help="number of times request is sent again after connection error "
+        "or server error response, with growing random delay; deletes and "
+        "exports are sent again only if connection could not be opened",
+        show_default="0",
+    ),
+    click.option(
+        "--max-concurrency",
+        default=0,
+        type=click.IntRange(min=0),
+        help="max number of requests sent to each server at the same time",
+        show_default="0, no limit",
+    ),
+    click.option(
+        "--max-rps",
+        default=0,
+        type=click.FloatRange(min=0),
+        help="max number of requests sent to each server per second",
+        show_default="0, no limit",
+    ),
+    click.option(
+        "--timeout",
+        default=60,
+        type=click.FloatRange(min=0),
+        help="seconds to wait for connection to server and for each read "
+        "of its answer, 0 for no limit",
+        show_default="60",
+    ),
+    click.option(
+        "--timings",
+        is_flag=True,
+        help="print JSON summary of each request and time of each phase "
+        "per server to stderr",
+    ),
+]
+
+
+_cache_options = [
+    click.option(
+        "--cache-ttl",
+        default=0,
+        type=click.IntRange(min=0),
+        help="use data stored on disk if not older than given number of seconds",
+        show_default="0, disabled",
+    ),
+    click.option(
+        "--refresh",
+        is_flag=True,
+        help="ignore data stored on disk and store fresh one, use with --cache-ttl",
+    ),
+]
+
+
+_merge_options = [
+    click.option(
+        "--merge",
+        is_flag=True,
+        help="print data of all servers as one output with host column, "
+        "rows of each server are written as soon as it answers",
+    ),
+]
+
+
+_offline_options = [
+    click.option(
+        "--offline",
+        is_flag=True,
+        help="answer from local inventory stored by tnscm sync, "
+        "without talking to Nessus",
+    ),
+]
+
+
+_compact_options = [
+    click.option(
+        "--compact",
+        is_flag=True,
+        help="keep fetched lists as compact records instead of dicts, "
+        "uses less memory with many servers",
+    ),
+]
+
+
+_workers_options = [
+    click.option(
+        "--workers",
+        default=1,
+        type=click.IntRange(min=1),
+        help="number of processes servers are split between, each one "
+        "talks to --parallel servers and decodes and filters their data",
+        show_default="1",
+    ),
+]
+
+
+_timestamp_options = [
+    click.option(
+        "--raw-timestamps",
+        is_flag=True,
+        help="keep dates as epoch seconds returned by Nessus API",
+    ),
+]
 
 
 def add_options(options):
@@ -79,10 +265,11 @@ def add_options(options):
     return _add_options
 
 
-def set_vault_password(address, username, password):
-    password_from_vault = keyring.get_password(address, username)
+def set_vault_password(address, username, password, credential_cache):
+    vault_init()
+    password_from_vault = credential_cache.get(address, username)
     if password_from_vault is None:
-        keyring.set_password(address, username, password)
+        credential_cache.set(address, username, password)
         if platform.system() == "Windows":
             print("Credentials successfully saved to Windows Credential Manager.")
             print(
@@ -114,7 +301,7 @@ def set_vault_password(address, username, password):
         )
 
         if vault_update_answer == "yes":
-            keyring.set_password(address, username, password)
+            credential_cache.set(address, username, password)
             if platform.system() == "Windows":
                 print("Credentials successfully saved to Windows Credential Manager.")
                 print(
@@ -132,12 +319,13 @@ def set_vault_password(address, username, password):
                 )
 
 
-def get_vault_password(address, username, verbose):
+def get_vault_password(address, username, verbose, credential_cache):
     password = None
     if platform.system() == "Windows" or platform.system() == "Darwin":
         if verbose:
             print("Looking for password in OS Credential Manager")
-        password_from_vault = keyring.get_password(address, username)
+        vault_init()
+        password_from_vault = credential_cache.get(address, username)
         if password_from_vault:
             password = password_from_vault
             if verbose:
@@ -149,20 +337,383 @@ def get_vault_password(address, username, verbose):
     return password
 
 
-def password_check(address, username, password, verbose):
+def password_check(address, username, password, verbose, credential_cache):
     if not password:
-        password = get_vault_password(address, username, verbose)
+        password = get_vault_password(address, username, verbose, credential_cache)
 
     if not password:
         password = click.prompt("password", hide_input=True, confirmation_prompt=True)
-        set_vault_password(address, username, password)
+        set_vault_password(address, username, password, credential_cache)
 
     if password:
-        set_vault_password(address, username, password)
+        set_vault_password(address, username, password, credential_cache)
+
+    return password
+
+
+def cache_get(cache_ttl, refresh):
+    if not cache_ttl:
+        return None
+
+    return diskcache.DiskCache(cache_ttl, refresh)
+
+
+def sessions_get(reuse_session):
+    if not reuse_session:
+        return None
+
+    return sessionstore.SessionStore()
+
+
+def snapshots_get(incremental, full_sync):
+    if not incremental:
+        return None
+
+    return scansync.ScanSnapshots(full=full_sync)
+
+
+def timings_get(timings):
+    if not timings:
+        return None
+
+    recorder = tracing.Timings()
+    # written also when command ends with sys.exit()
+    click.get_current_context().call_on_close(recorder.dump)
+    return recorder
+
+
+def api_options_get(retries, max_concurrency, max_rps, timeout):
+    return {
+        "retries": retries,
+        "max_concurrency": max_concurrency or None,
+        "max_rps": max_rps or None,
+        "timeout": timeout or None,
+    }
+
+
+def credential_get(address, username, credential, verbose, credential_cache):
+    """
+    Password of host given in --hosts-file, from environment variable or
+    keyring service named by its credential.
+    """
+    scheme, _, name = credential.partition(":")
+    if verbose:
+        print("Looking for password of {} in {}".format(address, credential))
+    if scheme == "env":
+        password = os.environ.get(name)
+    else:
+        password = credential_cache.get(name or address, username)
+
+    if not password:
+        raise click.UsageError(
+            "No password of {} found in {}.".format(address, credential)
+        )
 
     return password
 
 
+def vault_keys_get(entries):
+    """
+    (service, username) of keyring which password_check() and
+    credential_get() will read for given hosts.
+    """
+    keys = []
+    for entry in entries:
+        if not entry.credential:
+            keys.append((entry.address, entry.username))
+            continue
+        scheme, _, name = entry.credential.partition(":")
+        if scheme == "keyring":
+            keys.append((name or entry.address, entry.username))
+
+    return keys
+
+
+def hosts_get(
+    address,
+    port,
+    username,
+    password,
+    insecure,
+    verbose,
+    timings=None,
+    offline=False,
+    hosts_file=None,
+):
+    entries = [
+        hostsfile.Entry(one_address, port, username, None, insecure)
+        for one_address in address
+    ]
+    if hosts_file:
+        try:
+            entries += hostsfile.load(hosts_file, port, username, insecure)
+        except hostsfile.HostsFileError as e:
+            raise click.BadParameter(str(e), param_hint="'--hosts-file'")
+    if not entries:
+        raise click.UsageError("No hosts given with --address or --hosts-file.")
+
+    credential_cache = None
+    if not offline:
+        vault_init()
+        credential_cache = credentials.CredentialCache(
+            keyring.get_password, keyring.set_password
+        )
+        # every keyring lookup of the fleet at once, instead of host by host
+        credential_cache.prefetch(vault_keys_get(entries))
+
+    hosts = []
+    for entry in entries:
+        one_password = None
+        if not offline:
+            with tracing.host_get(timings, entry.address).phase("password"):
+                if entry.credential:
+                    one_password = credential_get(
+                        entry.address,
+                        entry.username,
+                        entry.credential,
+                        verbose,
+                        credential_cache,
+                    )
+                else:
+                    one_password = password_check(
+                        entry.address,
+                        entry.username,
+                        password,
+                        verbose,
+                        credential_cache,
+                    )
+        hosts.append(
+            results.Host(
+                entry.address, entry.port, entry.username, one_password, entry.insecure
+            )
+        )
+
+    return hosts
+
+
+def data_fetch(
+    hosts,
+    methods,
+    parallel=1,
+    offline=False,
+    filter=None,
+    workers=1,
+    raw_timestamps=False,
+    **options,
+):
+    """
+    Data fetched by fleet.fetch() or, with --offline, stored by tnscm sync.
+
+    With --workers above 1 data is fetched and filtered by
+    shards.fetch() in worker processes, as results.Filtered.
+    """
+    if workers > 1:
+        # default filters of list options are the same as in tnscm serve
+        resources = {
+            resource.method: resource for resource in daemon.RESOURCES.values()
+        }
+        queries = [
+            shards.Query(
+                method,
+                filter or resources[method].default_filter,
+                resources[method].timestamp_fields,
+                raw_timestamps,
+            )
+            for method in methods
+        ]
+        yield from shards.fetch(hosts, methods, workers, parallel, queries, **options)
+        return
+
+    if not offline:
+        yield from fleet.fetch(hosts, methods, parallel, **options)
+        return
+
+    inventory_db = inventory.Inventory()
+    try:
+        yield from inventory_db.fetch(hosts, methods, filter)
+    finally:
+        inventory_db.close()
+
+
+def host_error_check(result):
+    if result.error is None:
+        return
+
+    if isinstance(result.error, ConnectionError):
+        print(
+            "Can't reach Nessus API via {}. Please check your connection.".format(
+                result.host.address
+            )
+        )
+        sys.exit(1)
+
+    if isinstance(result.error, inventory.NotSyncedError):
+        print(result.error)
+        sys.exit(1)
+
+    if isinstance(result.error, apierrors.TnsApiError):
+        print(result.host.address, result.error)
+        sys.exit(1)
+
+    from oauthlib.oauth2.rfc6749.errors import CustomOAuth2Error
+
+    if isinstance(result.error, CustomOAuth2Error):
+        print(
+            "Can't login to Nessus API with supplied credentials. Please make sure they are correct."
+        )
+        sys.exit(1)
+
+    raise result.error
+
+
+def delete_items(
+    tnscon, method, ids, items_name, parallel, format, host_timings=tracing.DISABLED
+):
+    def progress(done, total, report):
+        click.echo("\rDeleting {} {}/{}".format(items_name, done, total), nl=False)
+
+    with host_timings.phase("delete"):
+        reports = bulkdelete.delete(tnscon, method, ids, parallel, progress)
+    click.echo()
+
+    data_print(reports, format, host_timings=host_timings)
+
+    counts = bulkdelete.summary(reports)
+    print(
+        "Deleted: {}, not found: {}, failed: {}".format(
+            counts[bulkdelete.DELETED],
+            counts[bulkdelete.NOT_FOUND],
+            counts[bulkdelete.FAILED],
+        )
+    )
+
+
+def scan_details_print(jobs, format, parallel, raw_timestamps, cache_ttl, refresh):
+    """
+    Write details of each scan as soon as it is fetched, with host column.
+
+    Records are stored on disk only with cache_ttl, see DetailStore.
+    """
+    output = writers.ListWriter() if format == "table" else writers.writer_get(format)
+
+    for job, record, error in scandetails.fetch(
+        jobs,
+        scandetails.DetailStore(cache_ttl, refresh) if cache_ttl else None,
+        parallel,
+    ):
+        if error is not None:
+            click.echo(
+                "{} scan {}: {}".format(job.host.address, job.scan_id, error), err=True
+            )
+            continue
+        if not raw_timestamps:
+            # stored record keeps dates returned by Nessus
+            record = copy.deepcopy(record)
+            timestamps.normalize([record], timestamps.DETAIL_FIELDS)
+            timestamps.normalize(record["history"], timestamps.HISTORY_FIELDS)
+        if format == "table":
+            # list of runs does not fit in a table cell, history_count does
+            record = {key: value for key, value in record.items() if key != "history"}
+        output.write_rows(
+            writers.host_rows(job.host.address, record),
+            ["host"] + list(record),
+        )
+        sys.stdout.flush()
+
+    merged_output_close(output, format)
+
+
+def export_scans(jobs, format, directory, parallel, output_format):
+    def progress(done, total, report):
+        click.echo("\rExporting scans {}/{}".format(done, total), nl=False)
+
+    reports = scanexport.export(jobs, format, directory, parallel, progress)
+    click.echo()
+
+    data_print(reports, output_format)
+
+    counts = scanexport.summary(reports)
+    print(
+        "Exported: {}, failed: {}".format(
+            counts[scanexport.EXPORTED], counts[scanexport.FAILED]
+        )
+    )
+
+
+def data_filter(
+    data,
+    filter,
+    default_filter,
+    timestamp_fields=None,
+    raw_timestamps=False,
+    host_timings=tracing.DISABLED,
+):
+    if isinstance(data, results.Filtered):
+        return data.value
+
+    expression = filter or default_filter
+    # records of --compact are turned to dicts one server at a time
+    data = records.unpack(data)
+
+    if timestamp_fields and not raw_timestamps:
+        with host_timings.phase("timestamps"):
+            fields = timestamps.fields_used(expression, timestamp_fields)
+            timestamps.normalize(data, fields)
+
+    with host_timings.phase("filter"):
+        return filterplan.compile(expression).search(data)
+
+
+def data_print(
+    data,
+    format,
+    output=None,
+    host=None,
+    host_timings=tracing.DISABLED,
+    expression=None,
+):
+    """
+    :param expression: filter data has been filtered with, merged CSV is
+                       written as it comes if keys of its rows are known
+    """
+    with host_timings.phase("render"):
+        if output is not None:
+            fields = filterplan.fields_get(expression) if expression else None
+            output.write_rows(
+                writers.host_rows(host, data),
+                None if fields is None else ["host"] + fields,
+            )
+            sys.stdout.flush()
+        elif format == "table":
+            print(dataframe_table(data))
+        else:
+            writers.write(data, format)
+
+
+def merged_output_get(format, merge, delete=False):
+    """
+    Writer shared by all servers for --merge, None if output is not merged.
+    """
+    if not merge:
+        return None
+    if delete:
+        raise click.UsageError("--merge can't be used with --delete.")
+    if format == "table":
+        # table is aligned to all rows, so it is printed at the end
+        return writers.ListWriter()
+
+    return writers.writer_get(format)
+
+
+def merged_output_close(output, format):
+    if output is None:
+        return
+    if format == "table":
+        print(dataframe_table(output.rows))
+    else:
+        output.close()
+
+
 def dataframe_table(data, sortby=None, groupby=None, tablefmt=None):
     pd.set_option("display.max_rows", None)
     pd.set_option("display.max_columns", None)
@@ -177,7 +728,7 @@ def dataframe_table(data, sortby=None, groupby=None, tablefmt=None):
     s = pd.Series(data=list(range(1, len(df) + 1)), dtype="object")
     df = df.set_index(s)
     if tablefmt:
-        df = str(tabulate(df, headers="keys", tablefmt=tablefmt))
+        df = str(tabulate.tabulate(df, headers="keys", tablefmt=tablefmt))
     return df
 
 
@@ -221,6 +772,7 @@ def cli(ctx, update_check):
 )
 @click.option("--version", is_flag=True, help="Get server version")
 def server(
+    hosts_file,
     address,
     port,
     username,
@@ -232,34 +784,53 @@ def server(
     ips,
     version,
     verbose,
+    parallel,
+    engine,
+    reuse_session,
+    timings,
+    retries,
+    max_concurrency,
+    max_rps,
+    timeout,
 ):
     """get Nessus server info"""
 
-    for one_address in address:
-        one_password = password_check(one_address, username, password, verbose)
-
-        try:
-            tnscon = TnsApi(one_address, port, insecure)
-            tnscon.login(username, one_password)
-        except ConnectionError as e:
-            print(
-                "Can't reach Nessus API via {} Please check your connection.".format(
-                    one_address
-                )
-            )
-            sys.exit(1)
-
-        except CustomOAuth2Error as e:
-            print(
-                "Can't login to Nessus API with supplied credentials. Please make sure they are correct."
-            )
-            sys.exit(1)
+    methods = []
+    if status:
+        methods.append("server_status_get")
+    if ips or version:
+        methods.append("server_properties_get")
+
+    recorder = timings_get(timings)
+    hosts = hosts_get(
+        address,
+        port,
+        username,
+        password,
+        insecure,
+        verbose,
+        recorder,
+        hosts_file=hosts_file,
+    )
+    sessions = sessions_get(reuse_session)
+
+    for result in fleet.fetch(
+        hosts,
+        methods,
+        parallel,
+        engine=engine,
+        sessions=sessions,
+        timings=recorder,
+        api_options=api_options_get(retries, max_concurrency, max_rps, timeout),
+    ):
+        one_address = result.host.address
+        host_error_check(result)
 
         if status:
-            server_status = tnscon.server_status_get()
+            server_status = result.data["server_status_get"]
             print(one_address, server_status)
         if ips:
-            server_properties = tnscon.server_properties_get()
+            server_properties = result.data["server_properties_get"]
             licensed_ips = server_properties["license"]["ips"]
             active_ips = server_properties["used_ip_count"]
             left_ips = int(licensed_ips) - int(active_ips)
@@ -280,57 +851,90 @@ def server(
             )
 
         if version:
-            nessus_type = tnscon.server_properties_get()["nessus_type"]
-            server_version = tnscon.server_properties_get()["server_version"]
+            nessus_type = result.data["server_properties_get"]["nessus_type"]
+            server_version = result.data["server_properties_get"]["server_version"]
             print(one_address, nessus_type, server_version)
 
-        tnscon.logout()
-
 
 @cli.command()
 @add_options(_login_options)
 @add_options(_general_options)
+@add_options(_merge_options)
 @click.option("--list", is_flag=True, help="Get user list")
-def user(address, port, username, password, insecure, format, filter, list, verbose):
+@add_options(_timestamp_options)
+@add_options(_offline_options)
+@add_options(_compact_options)
+@add_options(_workers_options)
+def user(
+    hosts_file,
+    address,
+    port,
+    username,
+    password,
+    insecure,
+    format,
+    filter,
+    list,
+    verbose,
+    parallel,
+    engine,
+    reuse_session,
+    timings,
+    retries,
+    max_concurrency,
+    max_rps,
+    timeout,
+    merge,
+    raw_timestamps,
+    offline,
+    compact,
+    workers,
+):
     """get Nessus user info"""
 
-    for one_address in address:
-        one_password = password_check(one_address, username, password, verbose)
-
-        try:
-            tnscon = TnsApi(one_address, port, insecure)
-            tnscon.login(username, one_password)
-        except ConnectionError as e:
-            print(
-                "Can't reach Nessus API via {} Please check your connection.".format(
-                    one_address
-                )
-            )
-            sys.exit(1)
-
-        except CustomOAuth2Error as e:
-            print(
-                "Can't login to Nessus API with supplied credentials. Please make sure they are correct."
-            )
-            sys.exit(1)
+    if workers > 1 and offline:
+        raise click.UsageError("--workers can't be used with --offline.")
+
+    methods = ["users_get"] if list else []
+    output = merged_output_get(format, merge)
+
+    recorder = timings_get(timings)
+    hosts = hosts_get(
+        address,
+        port,
+        username,
+        password,
+        insecure,
+        verbose,
+        recorder,
+        offline,
+        hosts_file=hosts_file,
+    )
+    sessions = sessions_get(reuse_session)
+
+    for result in data_fetch(
+        hosts,
+        methods,
+        parallel,
+        offline=offline,
+        filter=filter,
+        engine=engine,
+        sessions=sessions,
+        ordered=not merge,
+        timings=recorder,
+        api_options=api_options_get(retries, max_concurrency, max_rps, timeout),
+        compact=compact,
+        workers=workers,
+        raw_timestamps=raw_timestamps,
+    ):
+        one_address = result.host.address
+        host_error_check(result)
+        host_timings = tracing.host_get(recorder, one_address)
 
         if list:
-            print(one_address)
-            users_on_nessus = tnscon.users_get()
-
-            for user_on_nessus in users_on_nessus:
-                if "lastlogin" in user_on_nessus:
-                    user_on_nessus.update(
-                        {
-                            "lastlogin": str(
-                                datetime.datetime.fromtimestamp(
-                                    0
-                                    if user_on_nessus["lastlogin"] is None
-                                    else user_on_nessus["lastlogin"]
-                                )
-                            )
-                        }
-                    )
+            if not merge:
+                print(one_address)
+            users_on_nessus = result.data["users_get"]
 
             default_filter = (
                 "[].{"
@@ -340,84 +944,125 @@ def user(address, port, username, password, insecure, format, filter, list, verb
                 "lastlogin: lastlogin}"
             )
 
-            if filter:
-                expression = jmespath.compile(filter)
-            else:
-                expression = jmespath.compile(default_filter)
-
-            users_on_nessus = expression.search(users_on_nessus)
+            users_on_nessus = data_filter(
+                users_on_nessus,
+                filter,
+                default_filter,
+                timestamps.USER_FIELDS,
+                raw_timestamps,
+                host_timings=host_timings,
+            )
 
-            if format == "table":
-                print(dataframe_table(users_on_nessus))
-            elif format == "csv":
-                print(dataframe_table(users_on_nessus).to_csv(index=False), "\n")
-            else:
-                print(users_on_nessus)
+            data_print(
+                users_on_nessus,
+                format,
+                output,
+                one_address,
+                host_timings,
+                filter or default_filter,
+            )
 
         else:
             print("No option given!")
 
-        tnscon.logout()
+    merged_output_close(output, format)
 
 
 @cli.command()
 @add_options(_login_options)
 @add_options(_general_options)
+@add_options(_merge_options)
 @click.option("--list", is_flag=True, help="Get scan policy list")
 @click.option("--delete", is_flag=True, help="Delete scan policy")
+@add_options(_timestamp_options)
+@add_options(_cache_options)
+@add_options(_offline_options)
+@add_options(_compact_options)
+@add_options(_workers_options)
 def policy(
-    address, port, username, password, insecure, format, filter, list, delete, verbose
+    hosts_file,
+    address,
+    port,
+    username,
+    password,
+    insecure,
+    format,
+    filter,
+    list,
+    delete,
+    verbose,
+    parallel,
+    engine,
+    reuse_session,
+    timings,
+    retries,
+    max_concurrency,
+    max_rps,
+    timeout,
+    merge,
+    cache_ttl,
+    refresh,
+    raw_timestamps,
+    offline,
+    compact,
+    workers,
 ):
     """get Nessus policy info"""
 
-    for one_address in address:
-        one_password = password_check(one_address, username, password, verbose)
-
-        try:
-            tnscon = TnsApi(one_address, port, insecure)
-            tnscon.login(username, one_password)
-        except ConnectionError as e:
-            print(
-                "Can't reach Nessus API via {}. Please check your connection.".format(
-                    one_address
-                )
-            )
-            sys.exit(1)
-
-        except CustomOAuth2Error as e:
-            print(
-                "Can't login to Nessus API with supplied credentials. Please make sure they are correct."
-            )
-            sys.exit(1)
+    if workers > 1 and (delete or offline):
+        raise click.UsageError("--workers can't be used with --delete or --offline.")
+
+    if offline and delete:
+        raise click.UsageError("--offline can be used only with --list.")
+
+    methods = ["policies_get"] if list or delete else []
+    output = merged_output_get(format, merge, delete)
+
+    recorder = timings_get(timings)
+    hosts = hosts_get(
+        address,
+        port,
+        username,
+        password,
+        insecure,
+        verbose,
+        recorder,
+        offline,
+        hosts_file=hosts_file,
+    )
+    sessions = sessions_get(reuse_session)
+
+    for result in data_fetch(
+        hosts,
+        methods,
+        parallel,
+        offline=offline,
+        filter=filter,
+        keep_session=delete,
+        engine=engine,
+        cache=cache_get(cache_ttl, refresh),
+        sessions=sessions,
+        ordered=not merge,
+        timings=recorder,
+        api_options=api_options_get(retries, max_concurrency, max_rps, timeout),
+        compact=compact,
+        workers=workers,
+        raw_timestamps=raw_timestamps,
+    ):
+        one_address = result.host.address
+        host_error_check(result)
+        host_timings = tracing.host_get(recorder, one_address)
+        tnscon = result.tnscon
 
         if list:
-            print(one_address)
-            scan_policies_on_nessus = tnscon.policies_get()
+            if not merge:
+                print(one_address)
+            scan_policies_on_nessus = result.data["policies_get"]
             if scan_policies_on_nessus is None:
                 print("No items!")
                 sys.exit(1)
-
-            for scan_policy_on_nessus in scan_policies_on_nessus:
-                if "creation_date" in scan_policy_on_nessus:
-                    scan_policy_on_nessus.update(
-                        {
-                            "creation_date": str(
-                                datetime.datetime.fromtimestamp(
-                                    int(scan_policy_on_nessus["creation_date"])
-                                )
-                            )
-                        }
-                    )
-                if "last_modification_date" in scan_policy_on_nessus:
-                    scan_policy_on_nessus.update(
-                        {
-                            "last_modification_date": str(
-                                datetime.datetime.fromtimestamp(
-                                    int(scan_policy_on_nessus["last_modification_date"])
-                                )
-                            )
-                        }
-                    )
+            if delete:
+                scan_policies_on_nessus = copy.deepcopy(scan_policies_on_nessus)
 
             default_filter = (
                 "[].{"
@@ -428,56 +1073,35 @@ def policy(
                 "last_modification_date: last_modification_date}"
             )
 
-            if filter:
-                expression = jmespath.compile(filter)
-            else:
-                expression = jmespath.compile(default_filter)
-
-            scan_policies_on_nessus = expression.search(scan_policies_on_nessus)
+            scan_policies_on_nessus = data_filter(
+                scan_policies_on_nessus,
+                filter,
+                default_filter,
+                timestamps.POLICY_FIELDS,
+                raw_timestamps,
+                host_timings=host_timings,
+            )
 
             if scan_policies_on_nessus is not None:
-                if format == "table":
-                    print(dataframe_table(scan_policies_on_nessus))
-                elif format == "csv":
-                    print(
-                        dataframe_table(scan_policies_on_nessus).to_csv(index=False),
-                        "\n",
-                    )
-                else:
-                    print(scan_policies_on_nessus)
-            else:
+                data_print(
+                    scan_policies_on_nessus,
+                    format,
+                    output,
+                    one_address,
+                    host_timings,
+                    filter or default_filter,
+                )
+            elif not merge:
                 print("{} doesn't have any policies!".format(username))
 
         if delete:
             print(one_address)
-            scan_policies_on_nessus = tnscon.policies_get()
+            scan_policies_on_nessus = result.data["policies_get"]
 
             if scan_policies_on_nessus is None:
                 print("No items!")
                 sys.exit(1)
 
-            for scan_policy_on_nessus in scan_policies_on_nessus:
-                if "creation_date" in scan_policy_on_nessus:
-                    scan_policy_on_nessus.update(
-                        {
-                            "creation_date": str(
-                                datetime.datetime.fromtimestamp(
-                                    int(scan_policy_on_nessus["creation_date"])
-                                )
-                            )
-                        }
-                    )
-                if "last_modification_date" in scan_policy_on_nessus:
-                    scan_policy_on_nessus.update(
-                        {
-                            "last_modification_date": str(
-                                datetime.datetime.fromtimestamp(
-                                    int(scan_policy_on_nessus["last_modification_date"])
-                                )
-                            )
-                        }
-                    )
-
             default_filter = (
                 "[].{"
                 "id: id, "
@@ -487,23 +1111,17 @@ def policy(
                 "last_modification_date: last_modification_date}"
             )
 
-            if filter:
-                expression = jmespath.compile(filter)
-            else:
-                expression = jmespath.compile(default_filter)
-
-            scan_policies_on_nessus = expression.search(scan_policies_on_nessus)
+            scan_policies_on_nessus = data_filter(
+                scan_policies_on_nessus,
+                filter,
+                default_filter,
+                timestamps.POLICY_FIELDS,
+                raw_timestamps,
+                host_timings=host_timings,
+            )
 
             if scan_policies_on_nessus is not None:
-                if format == "table":
-                    print(dataframe_table(scan_policies_on_nessus))
-                elif format == "csv":
-                    print(
-                        dataframe_table(scan_policies_on_nessus).to_csv(index=False),
-                        "\n",
-                    )
-                else:
-                    print(scan_policies_on_nessus)
+                data_print(scan_policies_on_nessus, format, host_timings=host_timings)
 
                 if len(scan_policies_on_nessus) == 1:
                     item_or_items = "policy"
@@ -521,78 +1139,181 @@ def policy(
                         len(scan_policies_on_nessus), item_or_items
                     )
                 ):
-                    for scan_policy_on_nessus in scan_policies_on_nessus:
-                        scan_policy_id = scan_policy_on_nessus["id"]
-                        print("Deleting policy id {}".format(scan_policy_id))
-                        tnscon.policies_delete(scan_policy_id)
+                    scan_policy_ids = [
+                        scan_policy_on_nessus["id"]
+                        for scan_policy_on_nessus in scan_policies_on_nessus
+                    ]
+                    delete_items(
+                        tnscon,
+                        "policies_delete",
+                        scan_policy_ids,
+                        "policies",
+                        parallel,
+                        format,
+                        host_timings,
+                    )
                 else:
                     print("Nothing will be deleted")
 
             else:
                 print("{} doesn't have any policies!".format(username))
 
-        tnscon.logout()
+            with host_timings.phase("logout"):
+                fleet.logout(tnscon, sessions)
+
+    merged_output_close(output, format)
 
 
 @cli.command()
 @add_options(_login_options)
 @add_options(_general_options)
+@add_options(_merge_options)
 @click.option("--list", is_flag=True, help="Get scan list")
 @click.option("--delete", is_flag=True, help="Delete scan with whole history")
+@click.option(
+    "--export",
+    type=click.Choice(scanexport.FORMATS),
+    help="Export filtered scans to files",
+)
+@click.option(
+    "--export-dir",
+    default=".",
+    type=click.Path(file_okay=False),
+    help="directory where exported scans are written",
+    show_default="current directory",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="keep scan list of each server on disk and ask Nessus only for "
+    "scans changed since the previous run, whole list is fetched once a day",
+)
+@click.option(
+    "--full-sync",
+    is_flag=True,
+    help="fetch whole scan list now, use with --incremental",
+)
+@click.option(
+    "--details",
+    is_flag=True,
+    help="Get details and history of filtered scans, scans not modified "
+    "since previous run are not fetched again",
+)
+@add_options(_timestamp_options)
+@add_options(_cache_options)
+@add_options(_offline_options)
+@add_options(_compact_options)
+@add_options(_workers_options)
 def scan(
-    address, port, username, password, insecure, format, filter, list, delete, verbose
+    hosts_file,
+    address,
+    port,
+    username,
+    password,
+    insecure,
+    format,
+    filter,
+    list,
+    delete,
+    export,
+    export_dir,
+    incremental,
+    full_sync,
+    details,
+    verbose,
+    parallel,
+    engine,
+    reuse_session,
+    timings,
+    retries,
+    max_concurrency,
+    max_rps,
+    timeout,
+    merge,
+    cache_ttl,
+    refresh,
+    raw_timestamps,
+    offline,
+    compact,
+    workers,
 ):
     """get Nessus scan details info"""
 
-    for one_address in address:
-        one_password = password_check(one_address, username, password, verbose)
+    if workers > 1 and (delete or export or details or offline):
+        raise click.UsageError(
+            "--workers can't be used with --delete, --export, --details or --offline."
+        )
 
-        try:
-            tnscon = TnsApi(one_address, port, insecure)
-            tnscon.login(username, one_password)
-        except ConnectionError as e:
-            print(
-                "Can't reach Nessus API via {}. Please check your connection.".format(
-                    one_address
-                )
-            )
-            sys.exit(1)
-
-        except CustomOAuth2Error as e:
-            print(
-                "Can't login to Nessus API with supplied credentials. Please make sure they are correct."
-            )
-            sys.exit(1)
+    if export and delete:
+        raise click.UsageError("--export can't be used with --delete.")
+    if details and delete:
+        raise click.UsageError("--details can't be used with --delete.")
+    if offline and (delete or export or details):
+        raise click.UsageError("--offline can be used only with --list.")
+    if incremental and delete:
+        # stored list would still have deleted scans until next full sync
+        raise click.UsageError("--incremental can't be used with --delete.")
+
+    methods = ["scans_get"] if list or delete or export or details else []
+    output = merged_output_get(format, merge, delete)
+    export_jobs = []
+    details_jobs = []
+    kept_tnscons = []
+
+    recorder = timings_get(timings)
+    hosts = hosts_get(
+        address,
+        port,
+        username,
+        password,
+        insecure,
+        verbose,
+        recorder,
+        offline,
+        hosts_file=hosts_file,
+    )
+    sessions = sessions_get(reuse_session)
+
+    for result in data_fetch(
+        hosts,
+        methods,
+        parallel,
+        offline=offline,
+        filter=filter,
+        keep_session=delete or export or details,
+        engine=engine,
+        cache=cache_get(cache_ttl, refresh),
+        sessions=sessions,
+        ordered=not merge,
+        timings=recorder,
+        api_options=api_options_get(retries, max_concurrency, max_rps, timeout),
+        snapshots=snapshots_get(incremental, full_sync),
+        compact=compact,
+        workers=workers,
+        raw_timestamps=raw_timestamps,
+    ):
+        one_address = result.host.address
+        host_error_check(result)
+        host_timings = tracing.host_get(recorder, one_address)
+        tnscon = result.tnscon
+
+        if details and result.data["scans_get"] is not None:
+            # stored details are compared with dates returned by Nessus
+            modification_dates = {
+                scan_on_nessus["id"]: scan_on_nessus.get("last_modification_date")
+                for scan_on_nessus in result.data["scans_get"]
+            }
 
         if list:
-            print(one_address)
-            scans_on_nessus = tnscon.scans_get()
+            if not merge:
+                print(one_address)
+            scans_on_nessus = result.data["scans_get"]
             # print(scans_on_nessus)
             if scans_on_nessus is None:
                 print("No items!")
                 sys.exit(1)
-
-            for scan_on_nessus in scans_on_nessus:
-                if "creation_date" in scan_on_nessus:
-                    scan_on_nessus.update(
-                        {
-                            "creation_date": str(
-                                datetime.datetime.fromtimestamp(
-                                    int(scan_on_nessus["creation_date"])
-                                )
-                            )
-                        }
-                    )
-                if "last_modification_date" in scan_on_nessus:
-                    scan_on_nessus.update(
-                        {
-                            "last_modification_date": str(
-                                datetime.datetime.fromtimestamp(
-                                    int(scan_on_nessus["last_modification_date"])
-                                )
-                            )
-                        }
-                    )
+            if delete or export or details:
+                scans_on_nessus = copy.deepcopy(scans_on_nessus)
 
             default_filter = (
                 "[].{"
@@ -605,50 +1326,32 @@ def scan(
                 "status: status}"
             )
 
-            if filter:
-                expression = jmespath.compile(filter)
-            else:
-                expression = jmespath.compile(default_filter)
-
-            scans_on_nessus = expression.search(scans_on_nessus)
+            scans_on_nessus = data_filter(
+                scans_on_nessus,
+                filter,
+                default_filter,
+                timestamps.SCAN_FIELDS,
+                raw_timestamps,
+                host_timings=host_timings,
+            )
 
-            if format == "table":
-                print(dataframe_table(scans_on_nessus))
-            elif format == "csv":
-                print(dataframe_table(scans_on_nessus).to_csv(index=False), "\n")
-            else:
-                print(scans_on_nessus)
+            data_print(
+                scans_on_nessus,
+                format,
+                output,
+                one_address,
+                host_timings,
+                filter or default_filter,
+            )
 
         if delete:
             print(one_address)
-            scans_on_nessus = tnscon.scans_get()
+            scans_on_nessus = result.data["scans_get"]
             print(scans_on_nessus)
             if scans_on_nessus is None:
                 print("No items!")
                 sys.exit(1)
 
-            for scan_on_nessus in scans_on_nessus:
-                if "creation_date" in scan_on_nessus:
-                    scan_on_nessus.update(
-                        {
-                            "creation_date": str(
-                                datetime.datetime.fromtimestamp(
-                                    int(scan_on_nessus["creation_date"])
-                                )
-                            )
-                        }
-                    )
-                if "last_modification_date" in scan_on_nessus:
-                    scan_on_nessus.update(
-                        {
-                            "last_modification_date": str(
-                                datetime.datetime.fromtimestamp(
-                                    int(scan_on_nessus["last_modification_date"])
-                                )
-                            )
-                        }
-                    )
-
             default_filter = (
                 "[].{"
                 "folder_id: folder_id, "
@@ -660,20 +1363,17 @@ def scan(
                 "status: status}"
             )
 
-            if filter:
-                expression = jmespath.compile(filter)
-            else:
-                expression = jmespath.compile(default_filter)
-
-            scans_on_nessus = expression.search(scans_on_nessus)
+            scans_on_nessus = data_filter(
+                scans_on_nessus,
+                filter,
+                default_filter,
+                timestamps.SCAN_FIELDS,
+                raw_timestamps,
+                host_timings=host_timings,
+            )
 
             if scans_on_nessus is not None:
-                if format == "table":
-                    print(dataframe_table(scans_on_nessus))
-                elif format == "csv":
-                    print(dataframe_table(scans_on_nessus).to_csv(index=False), "\n")
-                else:
-                    print(scans_on_nessus)
+                data_print(scans_on_nessus, format, host_timings=host_timings)
 
                 if len(scans_on_nessus) == 1:
                     item_or_items = "scan"
@@ -691,134 +1391,505 @@ def scan(
                         len(scans_on_nessus), item_or_items
                     )
                 ):
-                    for scan_on_nessus in scans_on_nessus:
-                        scan_on_nessus_id = scan_on_nessus["id"]
-                        print("Deleting scan id {}".format(scan_on_nessus_id))
-                        tnscon.scan_delete(scan_on_nessus_id)
+                    scan_on_nessus_ids = [
+                        scan_on_nessus["id"] for scan_on_nessus in scans_on_nessus
+                    ]
+                    delete_items(
+                        tnscon,
+                        "scan_delete",
+                        scan_on_nessus_ids,
+                        "scans",
+                        parallel,
+                        format,
+                        host_timings,
+                    )
                 else:
                     print("Nothing will be deleted")
 
+            with host_timings.phase("logout"):
+                fleet.logout(tnscon, sessions)
+
+        if export:
+            scans_on_nessus = result.data["scans_get"]
+            if scans_on_nessus is None:
+                print("No items!")
+                sys.exit(1)
+
+            default_filter = (
+                "[].{"
+                "folder_id: folder_id, "
+                "id: id, "
+                "name: name, "
+                "owner: owner, "
+                "creation_date: creation_date, "
+                "last_modification_date: last_modification_date, "
+                "status: status}"
+            )
+
+            scans_on_nessus = writers.rows_get(
+                data_filter(
+                    scans_on_nessus,
+                    filter,
+                    default_filter,
+                    timestamps.SCAN_FIELDS,
+                    raw_timestamps,
+                    host_timings=host_timings,
+                )
+            )
+
+            if scans_on_nessus and not all(
+                isinstance(scan_on_nessus, dict) and "id" in scan_on_nessus
+                for scan_on_nessus in scans_on_nessus
+            ):
+                print("\nYou can't export SCAN without SCAN ID. Use ID in your filter!")
+                sys.exit(0)
+
+            export_jobs.extend(
+                scanexport.Job(
+                    tnscon,
+                    one_address,
+                    scan_on_nessus["id"],
+                    scan_on_nessus.get("name"),
+                )
+                for scan_on_nessus in scans_on_nessus
+            )
+
+        if details:
+            scans_on_nessus = result.data["scans_get"]
+            if scans_on_nessus is None:
+                print("No items!")
+                sys.exit(1)
+            if export:
+                scans_on_nessus = copy.deepcopy(scans_on_nessus)
+
+            default_filter = (
+                "[].{"
+                "folder_id: folder_id, "
+                "id: id, "
+                "name: name, "
+                "owner: owner, "
+                "creation_date: creation_date, "
+                "last_modification_date: last_modification_date, "
+                "status: status}"
+            )
+
+            scans_on_nessus = writers.rows_get(
+                data_filter(
+                    scans_on_nessus,
+                    filter,
+                    default_filter,
+                    timestamps.SCAN_FIELDS,
+                    raw_timestamps,
+                    host_timings=host_timings,
+                )
+            )
+
+            if scans_on_nessus and not all(
+                isinstance(scan_on_nessus, dict) and "id" in scan_on_nessus
+                for scan_on_nessus in scans_on_nessus
+            ):
+                print(
+                    "\nYou can't get SCAN details without SCAN ID. Use ID in your filter!"
+                )
+                sys.exit(0)
+
+            details_jobs.extend(
+                scandetails.Job(
+                    tnscon,
+                    result.host,
+                    scan_on_nessus["id"],
+                    modification_dates.get(scan_on_nessus["id"]),
+                )
+                for scan_on_nessus in scans_on_nessus
+            )
+
+        if export or details:
+            kept_tnscons.append((tnscon, host_timings))
+
+    merged_output_close(output, format)
+
+    if details:
+        scan_details_print(
+            details_jobs, format, parallel, raw_timestamps, cache_ttl, refresh
+        )
+    if export:
+        export_scans(export_jobs, export, export_dir, parallel, format)
+    for tnscon, host_timings in kept_tnscons:
+        with host_timings.phase("logout"):
+            fleet.logout(tnscon, sessions)
+
 
 @cli.command()
 @add_options(_login_options)
 @add_options(_general_options)
+@add_options(_merge_options)
 @click.option("--family-list", is_flag=True, help="Get plugins families list")
+@add_options(_cache_options)
+@add_options(_offline_options)
+@add_options(_compact_options)
+@add_options(_workers_options)
 def plugin(
-    address, port, username, password, insecure, format, filter, family_list, verbose
+    hosts_file,
+    address,
+    port,
+    username,
+    password,
+    insecure,
+    format,
+    filter,
+    family_list,
+    verbose,
+    parallel,
+    engine,
+    reuse_session,
+    timings,
+    retries,
+    max_concurrency,
+    max_rps,
+    timeout,
+    merge,
+    cache_ttl,
+    refresh,
+    offline,
+    compact,
+    workers,
 ):
     """get Nessus plugin info"""
 
-    for one_address in address:
-        one_password = password_check(one_address, username, password, verbose)
-
-        try:
-            tnscon = TnsApi(one_address, port, insecure)
-            tnscon.login(username, one_password)
-        except ConnectionError as e:
-            print(
-                "Can't reach Nessus API via {}. Please check your connection.".format(
-                    one_address
-                )
-            )
-            sys.exit(1)
-
-        except CustomOAuth2Error as e:
-            print(
-                "Can't login to Nessus API with supplied credentials. Please make sure they are correct."
-            )
-            sys.exit(1)
+    if workers > 1 and offline:
+        raise click.UsageError("--workers can't be used with --offline.")
+
+    methods = ["plugins_families_get"] if family_list else []
+    output = merged_output_get(format, merge)
+
+    recorder = timings_get(timings)
+    hosts = hosts_get(
+        address,
+        port,
+        username,
+        password,
+        insecure,
+        verbose,
+        recorder,
+        offline,
+        hosts_file=hosts_file,
+    )
+    sessions = sessions_get(reuse_session)
+
+    for result in data_fetch(
+        hosts,
+        methods,
+        parallel,
+        offline=offline,
+        filter=filter,
+        engine=engine,
+        cache=cache_get(cache_ttl, refresh),
+        sessions=sessions,
+        ordered=not merge,
+        timings=recorder,
+        api_options=api_options_get(retries, max_concurrency, max_rps, timeout),
+        compact=compact,
+        workers=workers,
+    ):
+        one_address = result.host.address
+        host_error_check(result)
+        host_timings = tracing.host_get(recorder, one_address)
 
         if family_list:
-            print(one_address)
-            plugins_families_on_nessus = tnscon.plugins_families_get()
+            if not merge:
+                print(one_address)
+            plugins_families_on_nessus = result.data["plugins_families_get"]
 
             default_filter = "[].{" "id: id, " "name: name, " "count: count}"
 
-            if filter:
-                expression = jmespath.compile(filter)
-            else:
-                expression = jmespath.compile(default_filter)
-
-            plugins_families_on_nessus = expression.search(plugins_families_on_nessus)
+            plugins_families_on_nessus = data_filter(
+                plugins_families_on_nessus,
+                filter,
+                default_filter,
+                host_timings=host_timings,
+            )
 
-            if format == "table":
-                print(dataframe_table(plugins_families_on_nessus))
-            elif format == "csv":
-                print(
-                    dataframe_table(plugins_families_on_nessus).to_csv(index=False),
-                    "\n",
-                )
-            else:
-                print(plugins_families_on_nessus)
+            data_print(
+                plugins_families_on_nessus,
+                format,
+                output,
+                one_address,
+                host_timings,
+                filter or default_filter,
+            )
 
         else:
             print("No option given!")
 
-        tnscon.logout()
+    merged_output_close(output, format)
 
 
 @cli.command()
 @add_options(_login_options)
 @add_options(_general_options)
+@add_options(_merge_options)
 @click.option("--list", is_flag=True, help="Get settings list")
+@add_options(_offline_options)
+@add_options(_workers_options)
 def settings(
-    address, port, username, password, insecure, format, filter, list, verbose
+    hosts_file,
+    address,
+    port,
+    username,
+    password,
+    insecure,
+    format,
+    filter,
+    list,
+    verbose,
+    parallel,
+    engine,
+    reuse_session,
+    timings,
+    retries,
+    max_concurrency,
+    max_rps,
+    timeout,
+    merge,
+    offline,
+    workers,
 ):
     """get Nessus settings info"""
 
-    for one_address in address:
-        one_password = password_check(one_address, username, password, verbose)
+    if workers > 1 and offline:
+        raise click.UsageError("--workers can't be used with --offline.")
+
+    methods = ["settings_advanced_get"] if list else []
+    output = merged_output_get(format, merge)
+
+    recorder = timings_get(timings)
+    hosts = hosts_get(
+        address,
+        port,
+        username,
+        password,
+        insecure,
+        verbose,
+        recorder,
+        offline,
+        hosts_file=hosts_file,
+    )
+    sessions = sessions_get(reuse_session)
+
+    for result in data_fetch(
+        hosts,
+        methods,
+        parallel,
+        offline=offline,
+        filter=filter,
+        engine=engine,
+        sessions=sessions,
+        ordered=not merge,
+        timings=recorder,
+        api_options=api_options_get(retries, max_concurrency, max_rps, timeout),
+        workers=workers,
+    ):
+        one_address = result.host.address
+        host_error_check(result)
+        host_timings = tracing.host_get(recorder, one_address)
 
-        try:
-            tnscon = TnsApi(one_address, port, insecure)
-            tnscon.login(username, one_password)
-        except ConnectionError as e:
-            print(
-                "Can't reach Nessus API via {}. Please check your connection.".format(
-                    one_address
-                )
+        if list:
+            if not merge:
+                print(one_address)
+            advanced_settings_on_nessus = result.data["settings_advanced_get"]
+
+            default_filter = "[].{" "id: id, " "name: name, " "value: value}"
+
+            advanced_settings_on_nessus = data_filter(
+                advanced_settings_on_nessus,
+                filter,
+                default_filter,
+                host_timings=host_timings,
             )
-            sys.exit(1)
 
-        except CustomOAuth2Error as e:
-            print(
-                "Can't login to Nessus API with supplied credentials. Please make sure they are correct."
+            data_print(
+                advanced_settings_on_nessus,
+                format,
+                output,
+                one_address,
+                host_timings,
+                filter or default_filter,
             )
-            sys.exit(1)
 
-        if list:
-            print(one_address)
-            advanced_settings_on_nessus = tnscon.settings_advanced_get()
+        else:
+            print("No option given!")
 
-            default_filter = "[].{" "id: id, " "name: name, " "value: value}"
+    merged_output_close(output, format)
 
-            if filter:
-                expression = jmespath.compile(filter)
-            else:
-                expression = jmespath.compile(default_filter)
 
-            advanced_settings_on_nessus = expression.search(advanced_settings_on_nessus)
+@cli.command()
+@add_options(_connection_options)
+@add_options(_general_options)
+def sync(
+    hosts_file,
+    address,
+    port,
+    username,
+    password,
+    insecure,
+    verbose,
+    parallel,
+    engine,
+    reuse_session,
+    timings,
+    retries,
+    max_concurrency,
+    max_rps,
+    timeout,
+):
+    """store lists of all servers in local inventory for --offline"""
+
+    methods = list(inventory.METHODS)
+
+    recorder = timings_get(timings)
+    hosts = hosts_get(
+        address,
+        port,
+        username,
+        password,
+        insecure,
+        verbose,
+        recorder,
+        hosts_file=hosts_file,
+    )
+    sessions = sessions_get(reuse_session)
+    inventory_db = inventory.Inventory()
+
+    try:
+        for result in fleet.fetch(
+            hosts,
+            methods,
+            parallel,
+            engine=engine,
+            sessions=sessions,
+            ordered=False,
+            timings=recorder,
+            api_options=api_options_get(retries, max_concurrency, max_rps, timeout),
+        ):
+            one_address = result.host.address
+            host_error_check(result)
+
+            with tracing.host_get(recorder, one_address).phase("store"):
+                for method in methods:
+                    inventory_db.store(result.host, method, result.data[method])
 
-            if format == "table":
-                print(dataframe_table(advanced_settings_on_nessus))
-            elif format == "csv":
-                print(
-                    dataframe_table(advanced_settings_on_nessus).to_csv(index=False),
-                    "\n",
-                )
-            else:
-                print(advanced_settings_on_nessus)
+            print(
+                one_address,
+                ", ".join(
+                    "{} {}".format(len(result.data[method] or []), name)
+                    for method, name in inventory.METHODS.items()
+                ),
+            )
+            sys.stdout.flush()
+    finally:
+        inventory_db.close()
 
-        else:
-            print("No option given!")
 
-        tnscon.logout()
+@cli.command()
+@add_options(_connection_options)
+@add_options(_general_options)
+@click.option(
+    "--listen",
+    default="127.0.0.1:8835",
+    help="loopback address and port to answer HTTP queries on",
+    show_default="127.0.0.1:8835",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="unix socket to answer HTTP queries on, instead of --listen",
+)
+@click.option(
+    "--cache-ttl",
+    default=30,
+    type=click.IntRange(min=0),
+    help="answer queries from memory if data is not older than given "
+    "number of seconds",
+    show_default="30",
+)
+def serve(
+    hosts_file,
+    address,
+    port,
+    username,
+    password,
+    insecure,
+    verbose,
+    parallel,
+    engine,
+    reuse_session,
+    timings,
+    retries,
+    max_concurrency,
+    max_rps,
+    timeout,
+    listen,
+    socket_path,
+    cache_ttl,
+):
+    """keep sessions open and answer list queries over HTTP"""
+
+    recorder = timings_get(timings)
+    hosts = hosts_get(
+        address,
+        port,
+        username,
+        password,
+        insecure,
+        verbose,
+        recorder,
+        hosts_file=hosts_file,
+    )
+
+    # kept sessions are used from many threads, so --engine is not used
+    server_daemon = daemon.Daemon(
+        hosts,
+        cache_ttl,
+        parallel,
+        sessions=sessions_get(reuse_session),
+        timings=recorder,
+        api_options=api_options_get(retries, max_concurrency, max_rps, timeout),
+    )
+    try:
+        http_server = daemon.server_get(server_daemon, listen, socket_path, verbose)
+    except (OSError, ValueError) as e:
+        server_daemon.close()
+        raise click.UsageError(str(e))
+
+    print("Listening on {}".format(socket_path or listen))
+    if not socket_path:
+        print(
+            "Token for Authorization: Bearer header is in {}".format(
+                http_server.token_path
+            )
+        )
+    sys.stdout.flush()
+    # stopped by SIGTERM the same way as by Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        server_daemon.close()
 
 
 def main():
 
     print("tnscm v.{}".format(__version__))
-    cli()
+    try:
+        cli()
+    except apierrors.TnsApiError as e:
+        # e.g. logout after delete, errors of fetched data are handled per host
+        print(e)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
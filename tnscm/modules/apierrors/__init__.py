@@ -0,0 +1,52 @@
+class TnsApiError(Exception):
+
+    def __init__(self, status_code, reason, resource=None):
+        """
+        Nessus API answered with response code which can't be handled.
+
+        :param status_code: HTTP response code
+        :param reason: short description, e.g. `Unauthorized.`
+        :param resource: requested resource, e.g. `/scans`
+        """
+        super().__init__("Response code: {}\n{}".format(status_code, reason))
+        self.status_code = status_code
+        self.reason = reason
+        self.resource = resource
+
+    def __reduce__(self):
+        # sent back from worker processes of --workers
+        return type(self), (self.status_code, self.reason, self.resource)
+
+
+class UnauthorizedError(TnsApiError):
+    """
+    Response code 401, wrong credentials or session has expired.
+    """
+
+
+class ServerError(TnsApiError):
+    """
+    Response code 500.
+    """
+
+
+class ServiceUnavailableError(TnsApiError):
+    """
+    Response code 503.
+    """
+
+
+ERRORS = {
+    401: (UnauthorizedError, "Unauthorized."),
+    500: (ServerError, "Internal Server Error."),
+    503: (ServiceUnavailableError, "Service Unavailable."),
+}
+
+
+def check(status_code, resource=None):
+    """
+    Raise TnsApiError subclass for response codes which end the request.
+    """
+    if status_code in ERRORS:
+        error, reason = ERRORS[status_code]
+        raise error(status_code, reason, resource)
@@ -0,0 +1,434 @@
+import asyncio
+import json
+import ssl
+import time
+import certstore
+from tnscm.modules import apierrors
+from tnscm.modules import throttle
+from tnscm.modules.tnsapi import host_format, proxy_get
+
+# bytes of body read at once, each read has its own timeout
+READ_SIZE = 2**16
+
+
+class Response:
+
+    def __init__(self, status_code, headers, content):
+        """
+        :param status_code: HTTP status code returned by Nessus API
+        :param headers: dict with lowercase header names as keys
+        :param content: response body as bytes
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        # the same as requests.Response.ok
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ConnectFailed(ConnectionError):
+    """
+    Connection to Nessus API could not be opened, request has not been sent.
+    """
+
+
+class AsyncTnsApi:
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=443,
+        insecure=None,
+        pool_size=10,
+        on_request=None,
+        retries=0,
+        max_concurrency=None,
+        max_rps=None,
+        timeout=None,
+    ):
+        """
+        :param host: address to Nessus API `127.0.0.1`
+        :param port: port to Nessus API `443`
+        :param insecure: if True perform insecure SSL connections and transfers
+        :param pool_size: max number of connections kept open to Nessus API `10`
+        :param on_request: function called after each request, see TnsApi
+        :param retries: number of times request is sent again, see TnsApi
+        :param max_concurrency: max number of requests sent at the same time
+        :param max_rps: max number of requests sent per second
+        :param timeout: seconds to wait for connection to open and for each
+                        read from Nessus API, None for no limit
+        """
+        if proxy_get(host, port):
+            # requests of TnsApi go through the proxy, these can't
+            raise ValueError(
+                "Proxy is not supported by AsyncTnsApi, {} is reached "
+                "through one".format(host)
+            )
+        self.host = host
+        self.port = port
+
+        if not insecure:
+            self.ssl_context = ssl.create_default_context(cafile=certstore.ca_bundle)
+        else:
+            self.ssl_context = ssl.create_default_context()
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE
+
+        self._token = ""
+
+        self.timeout = timeout
+
+        self.on_request = on_request
+        self.retry = throttle.Retry(retries)
+        # concurrency is limited by the pool semaphore, rate by the limiter
+        self.limiter = throttle.Limiter(max_rps=max_rps)
+
+        if max_concurrency:
+            pool_size = min(pool_size, max_concurrency)
+        self._pool_size = pool_size
+        self._semaphore = None
+        self._idle = []
+        self._connections_opened = 0
+        self._requests_sent = 0
+
+    async def close(self):
+        """
+        Close all pooled connections to Nessus API.
+        """
+        while self._idle:
+            reader, writer = self._idle.pop()
+            writer.close()
+
+    def connection_stats(self):
+        """
+        Number of connections opened to Nessus API and number of requests
+        which reused already opened connection.
+        """
+        return {
+            "opened": self._connections_opened,
+            "reused": max(0, self._requests_sent - self._connections_opened),
+            "requests": self._requests_sent,
+        }
+
+    async def _open(self):
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=self.ssl_context),
+                self.timeout,
+            )
+        except ssl.SSLError:
+            raise
+        except asyncio.TimeoutError as e:
+            raise ConnectFailed(
+                "Connection not opened in {} seconds.".format(self.timeout)
+            ) from e
+        except OSError as e:
+            raise ConnectFailed(str(e)) from e
+        self._connections_opened += 1
+        return reader, writer
+
+    async def _wait(self, awaitable):
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError as e:
+            raise TimeoutError(
+                "Nessus API did not answer in {} seconds.".format(self.timeout)
+            ) from e
+
+    async def _read(self, reader, size=-1):
+        """
+        Body bytes, read in parts so the timeout applies to each part and
+        not to the whole body.
+
+        :param size: number of bytes, -1 to read until connection is closed
+        """
+        parts = []
+        left = size
+        while left != 0:
+            part = await self._wait(
+                reader.read(READ_SIZE if left < 0 else min(left, READ_SIZE))
+            )
+            if not part:
+                if size < 0:
+                    break
+                raise asyncio.IncompleteReadError(b"".join(parts), size)
+            parts.append(part)
+            if left > 0:
+                left -= len(part)
+        return b"".join(parts)
+
+    async def _read_body(self, reader, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                line = await self._wait(reader.readline())
+                size = int(line.split(b";")[0].strip(), 16)
+                if size == 0:
+                    while True:
+                        line = await self._wait(reader.readline())
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                    break
+                chunks.append(await self._read(reader, size))
+                await self._wait(reader.readline())
+            return b"".join(chunks)
+
+        if "content-length" in headers:
+            return await self._read(reader, int(headers["content-length"]))
+
+        return await self._read(reader)
+
+    async def _exchange(self, reader, writer, request):
+        try:
+            return await self._exchange_once(reader, writer, request)
+        except BaseException:
+            # e.g. malformed response, timeout or cancelled task, connection
+            # is left in unknown state
+            writer.close()
+            raise
+
+    async def _exchange_once(self, reader, writer, request):
+        writer.write(request)
+        await self._wait(writer.drain())
+
+        status_line = await self._wait(reader.readline())
+        if not status_line:
+            raise ConnectionResetError("Connection closed by Nessus API.")
+        status_code = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self._wait(reader.readline())
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if status_code in (204, 304) or 100 <= status_code < 200:
+            content = b""
+        else:
+            if not ("content-length" in headers or "transfer-encoding" in headers):
+                # body ends when server closes connection
+                headers["connection"] = "close"
+            content = await self._read_body(reader, headers)
+
+        return Response(status_code, headers, content)
+
+    async def request(self, method, resource, body=b""):
+        """
+        Send HTTP/1.1 request over pooled keep-alive connection, again after
+        connection error or response code from throttle.RETRY_STATUSES as
+        many times as `retries` allows, see TnsApi.send().
+        """
+        retryable = throttle.retryable(method, resource)
+
+        attempt = 0
+        while True:
+            try:
+                r = await self.request_once(method, resource, body)
+            except ssl.SSLCertVerificationError:
+                # certificate problems do not go away by retrying
+                raise
+            except (OSError, asyncio.IncompleteReadError) as e:
+                if attempt >= self.retry.retries or not (
+                    retryable or isinstance(e, ConnectFailed)
+                ):
+                    raise
+                delay = self.retry.delay(attempt)
+            else:
+                if (
+                    r.status_code not in throttle.RETRY_STATUSES
+                    or attempt >= self.retry.retries
+                    or not retryable
+                ):
+                    return r
+                delay = self.retry.delay(attempt, r.headers.get("retry-after"))
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def request_once(self, method, resource, body=b""):
+        wait = self.limiter.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        start = time.perf_counter()
+        try:
+            r = await self._request(method, resource, body)
+        except Exception:
+            if self.on_request is not None:
+                self.on_request(method, resource, None, 0, time.perf_counter() - start)
+            raise
+
+        if self.on_request is not None:
+            self.on_request(
+                method,
+                resource,
+                r.status_code,
+                len(r.content),
+                time.perf_counter() - start,
+            )
+        return r
+
+    async def _request(self, method, resource, body):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._pool_size)
+
+        request = (
+            "{} {} HTTP/1.1\r\n"
+            "Host: {}:{}\r\n"
+            "X-Cookie: token={}\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: {}\r\n"
+            "Accept-Encoding: identity\r\n"
+            "Connection: keep-alive\r\n"
+            "\r\n".format(
+                method,
+                resource,
+                host_format(self.host),
+                self.port,
+                self._token,
+                len(body),
+            ).encode("latin-1")
+            + body
+        )
+
+        async with self._semaphore:
+            self._requests_sent += 1
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._open()
+            try:
+                r = await self._exchange(reader, writer, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                # connection kept in pool has been closed by server meanwhile
+                reader, writer = await self._open()
+                r = await self._exchange(reader, writer, request)
+
+            if r.headers.get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+
+        return r
+
+    async def connect(self, method, resource, data=None):
+
+        data = json.dumps(data).encode("utf-8")
+
+        r = await self.request(method, resource, data)
+
+        apierrors.check(r.status_code, resource)
+
+        if method == "POST":
+            return r.json()
+        elif method == "PUT":
+            return None
+        elif method == "DELETE":
+            return r
+        else:
+            if "download" in resource:
+                return r.content
+            else:
+                return r.json()
+
+    async def login(self, usr, pwd):
+        """
+        Login to Nessus.
+        """
+
+        login = {"username": usr, "password": pwd}
+        data = await self.connect("POST", "/session", data=login)
+        self._token = data["token"]
+        return self._token
+
+    async def session_resume(self, token):
+        """
+        Use token of session opened earlier, if Nessus still accepts it.
+
+        :return: True if session is valid, False if login is needed
+        """
+        self._token = token
+        r = await self.request("GET", "/session", b"null")
+        if r.ok:
+            return True
+
+        self._token = ""
+        return False
+
+    async def logout(self):
+        """
+        Logout of Nessus.
+        """
+        await self.connect("DELETE", "/session")
+
+    async def session_get(self):
+        data = await self.connect("GET", "/session")
+        return data
+
+    async def server_status_get(self):
+        data = (await self.connect("GET", "/server/status"))["status"]
+        return data
+
+    async def server_properties_get(self):
+        data = await self.connect("GET", "/server/properties")
+        return data
+
+    async def policies_get(self):
+        data = (await self.connect("GET", "/policies"))["policies"]
+        return data
+
+    async def policies_delete(self, id):
+        data = await self.connect("DELETE", "/policies/{0}".format(id))
+        return data
+
+    async def users_get(self):
+        data = (await self.connect("GET", "/users"))["users"]
+        return data
+
+    async def folders_get(self):
+        data = await self.connect("GET", "/folders")
+        return data
+
+    async def scans_get(self):
+        data = (await self.connect("GET", "/scans"))["scans"]
+        return data
+
+    async def scans_changed_get(self, last_modification_date=None):
+        """
+        Whole `/scans` response, only with scans changed since given time.
+
+        :param last_modification_date: epoch seconds, all scans if None
+        :return: dict with `scans` (None if nothing changed), `folders` and
+                 server `timestamp`
+        """
+        resource = "/scans"
+        if last_modification_date is not None:
+            resource = "/scans?last_modification_date={0}".format(
+                int(last_modification_date)
+            )
+        data = await self.connect("GET", resource)
+        return data
+
+    async def scan_details_get(self, id):
+        data = await self.connect("GET", "/scans/{0}".format(id))
+        return data
+
+    async def scan_delete(self, id):
+        data = await self.connect("DELETE", "/scans/{0}".format(id))
+        return data
+
+    async def plugins_families_get(self):
+        data = (await self.connect("GET", "/plugins/families"))["families"]
+        return data
+
+    async def settings_advanced_get(self):
+        data = (await self.connect("GET", "/settings/advanced"))["preferences"]
+        return data
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DELETED = "deleted"
+NOT_FOUND = "not found"
+FAILED = "failed"
+
+
+def delete_one(tnscon, method, id):
+    """
+    Delete one item and classify the outcome.
+
+    :return: dict with id, outcome and detail
+    """
+    try:
+        r = getattr(tnscon, method)(id)
+    except Exception as e:
+        return {"id": id, "outcome": FAILED, "detail": str(e) or type(e).__name__}
+
+    if r.status_code == 404:
+        return {"id": id, "outcome": NOT_FOUND, "detail": ""}
+    if r.ok:
+        return {"id": id, "outcome": DELETED, "detail": ""}
+
+    return {"id": id, "outcome": FAILED, "detail": "HTTP {}".format(r.status_code)}
+
+
+def delete(tnscon, method, ids, parallel=1, progress=None):
+    """
+    Delete many items using bounded pool of workers.
+
+    :param tnscon: logged in TnsApi
+    :param method: TnsApi method name used to delete one item, e.g. `scan_delete`
+    :param ids: list of ids to delete
+    :param parallel: number of delete requests sent at the same time
+    :param progress: callable called with (done, total, report) after each item
+    :return: list of dicts with id, outcome and detail in the order of given ids
+    """
+    reports = {}
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        futures = {executor.submit(delete_one, tnscon, method, id): id for id in ids}
+        for future in as_completed(futures):
+            report = future.result()
+            reports[futures[future]] = report
+            if progress:
+                progress(len(reports), len(ids), report)
+
+    return [reports[id] for id in ids]
+
+
+def summary(reports):
+    """
+    Count reports by outcome.
+    """
+    counts = {DELETED: 0, NOT_FOUND: 0, FAILED: 0}
+    for report in reports:
+        counts[report["outcome"]] += 1
+
+    return counts
@@ -0,0 +1,73 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# lookups done at the same time by prefetch(), each one can be D-Bus or
+# OS Credential Manager round-trip
+PREFETCH_WORKERS = 8
+
+
+class CredentialCache:
+
+    def __init__(self, get_password, set_password, workers=PREFETCH_WORKERS):
+        """
+        Passwords of (service, username) read from keyring once per tnscm
+        run and kept in memory, only changed ones are written back.
+
+        :param get_password: function(service, username), e.g.
+                             keyring.get_password
+        :param set_password: function(service, username, password)
+        :param workers: number of lookups done at the same time by prefetch()
+        """
+        self.get_password = get_password
+        self.set_password = set_password
+        self.workers = workers
+        self.passwords = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, keys):
+        """
+        Look up all given (service, username) at the same time, so a long
+        list of hosts does not wait for each lookup in turn.
+
+        Failed lookups are not cached, get() of them tries again and raises
+        the error where it is handled.
+        """
+        with self._lock:
+            missing = list(dict.fromkeys(k for k in keys if k not in self.passwords))
+        if not missing:
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = {key: executor.submit(self.get_password, *key) for key in missing}
+        for key, future in futures.items():
+            if future.exception() is None:
+                with self._lock:
+                    self.passwords.setdefault(key, future.result())
+
+    def get(self, service, username):
+        """
+        Stored password, None if there is none.
+        """
+        key = (service, username)
+        with self._lock:
+            if key in self.passwords:
+                return self.passwords[key]
+
+        password = self.get_password(service, username)
+        with self._lock:
+            self.passwords[key] = password
+        return password
+
+    def set(self, service, username, password):
+        """
+        Store password unless the same one is already stored.
+
+        :return: True if password has been written
+        """
+        if self.get(service, username) == password:
+            return False
+
+        self.set_password(service, username, password)
+        with self._lock:
+            self.passwords[(service, username)] = password
+        return True
@@ -0,0 +1,533 @@
+import copy
+import errno
+import functools
+import hmac
+import io
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import socketserver
+import stat
+import threading
+import time
+import jmespath
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from tnscm.modules import apierrors
+from tnscm.modules import filterplan
+from tnscm.modules import fleet
+from tnscm.modules import timestamps
+from tnscm.modules import writers
+from tnscm.modules.diskcache import cache_dir
+from tnscm.modules.tnsapi import TnsApi
+
+Resource = namedtuple("Resource", ["method", "default_filter", "timestamp_fields"])
+
+# same data and default filters as list options of the commands
+RESOURCES = {
+    "/scans": Resource(
+        "scans_get",
+        "[].{"
+        "folder_id: folder_id, "
+        "id: id, "
+        "name: name, "
+        "owner: owner, "
+        "creation_date: creation_date, "
+        "last_modification_date: last_modification_date, "
+        "status: status}",
+        timestamps.SCAN_FIELDS,
+    ),
+    "/policies": Resource(
+        "policies_get",
+        "[].{"
+        "id: id, "
+        "name: name, "
+        "owner: owner, "
+        "creation_date: creation_date, "
+        "last_modification_date: last_modification_date}",
+        timestamps.POLICY_FIELDS,
+    ),
+    "/users": Resource(
+        "users_get",
+        "[].{" "id: id, " "username: username, " "name: name, " "lastlogin: lastlogin}",
+        timestamps.USER_FIELDS,
+    ),
+    "/plugins/families": Resource(
+        "plugins_families_get", "[].{" "id: id, " "name: name, " "count: count}", None
+    ),
+    "/settings/advanced": Resource(
+        "settings_advanced_get", "[].{" "id: id, " "name: name, " "value: value}", None
+    ),
+    "/server/status": Resource("server_status_get", "@", None),
+    "/server/properties": Resource("server_properties_get", "@", None),
+}
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+ERRORS_HEADER = "X-Tnscm-Errors"
+
+filter_get = functools.lru_cache(maxsize=128)(filterplan.compile)
+
+
+class HostSession:
+
+    def __init__(self, host, cache_ttl, sessions=None, timings=None, api_options=None):
+        """
+        Logged in TnsApi of one host kept between queries, with its pooled
+        connections and data fetched recently.
+
+        Login happens on the first query, and once again when Nessus says
+        session has expired.
+
+        :param host: fleet.Host
+        :param cache_ttl: seconds for which fetched data is answered from
+                          memory, 0 to fetch it on every query
+        :param sessions: SessionStore, to resume stored session
+        :param timings: Timings, to record requests of the host
+        :param api_options: dict with more TnsApi arguments, e.g. retries
+        """
+        self.host = host
+        self.cache_ttl = cache_ttl
+        self.sessions = sessions
+        self.host_timings = timings.host(host.address) if timings else None
+        self.tnscon = TnsApi(
+            host.address,
+            host.port,
+            host.insecure,
+            memoize=False,
+            on_request=self.host_timings.request if timings else None,
+            **(api_options or {}),
+        )
+        self.logged_in = False
+        self._data = {}
+        self._login_lock = threading.Lock()
+        self._method_locks = {}
+        self._lock = threading.Lock()
+
+    def login(self, expired=False):
+        with self._login_lock:
+            if self.logged_in and not expired:
+                return
+            # expired stored session is not resumed, fleet.login checks it
+            fleet.login(self.tnscon, self.host, self.sessions)
+            self.logged_in = True
+
+    def method_lock(self, method):
+        with self._lock:
+            return self._method_locks.setdefault(method, threading.Lock())
+
+    def cached(self, method):
+        with self._lock:
+            stored = self._data.get(method)
+        if stored is None or time.monotonic() - stored[0] > self.cache_ttl:
+            return None
+
+        return stored[1]
+
+    def get(self, method, refresh=False):
+        """
+        Result of TnsApi method, from memory if not older than cache_ttl.
+
+        Concurrent queries for the same data wait for one request instead
+        of sending their own.
+        """
+        if not refresh:
+            data = self.cached(method)
+            if data is not None:
+                return data
+
+        started = time.monotonic()
+        with self.method_lock(method):
+            with self._lock:
+                stored = self._data.get(method)
+            if stored is not None and stored[0] >= started:
+                # fetched by another query while this one was waiting
+                return stored[1]
+
+            self.login()
+            try:
+                data = getattr(self.tnscon, method)()
+            except apierrors.UnauthorizedError:
+                self.login(expired=True)
+                data = getattr(self.tnscon, method)()
+
+            with self._lock:
+                self._data[method] = (time.monotonic(), data)
+
+        return data
+
+    def close(self):
+        """
+        Logout, or leave stored session open, and close connections.
+        """
+        with self._login_lock:
+            try:
+                if self.logged_in:
+                    fleet.logout(self.tnscon, self.sessions)
+                else:
+                    self.tnscon.close()
+            finally:
+                self.logged_in = False
+
+
+def rows_filter(data, expression, timestamp_fields=None, raw_timestamps=False):
+    """
+    JMESPath result of cached data, which itself is left untouched.
+    """
+    if timestamp_fields and not raw_timestamps:
+        fields = timestamps.fields_used(expression, timestamp_fields)
+        if fields:
+            data = copy.deepcopy(data)
+            timestamps.normalize(data, fields)
+
+    return filter_get(expression).search(data)
+
+
+class Daemon:
+
+    def __init__(
+        self,
+        hosts,
+        cache_ttl=30,
+        parallel=1,
+        sessions=None,
+        timings=None,
+        api_options=None,
+    ):
+        """
+        Answers list and status queries about many hosts, keeping their
+        sessions, connections and data between queries.
+
+        :param hosts: list of fleet.Host
+        :param cache_ttl: seconds for which data of each host is answered
+                          from memory `30`
+        :param parallel: number of hosts to talk to at the same time
+        :param sessions: SessionStore, to resume stored sessions and leave
+                         them open on close
+        :param timings: Timings, to record requests of each host
+        :param api_options: dict with more TnsApi arguments, e.g. retries
+        """
+        self.hosts = {
+            host.address: HostSession(host, cache_ttl, sessions, timings, api_options)
+            for host in hosts
+        }
+        self.executor = ThreadPoolExecutor(max_workers=max(1, parallel))
+
+    def query(
+        self, path, filter=None, addresses=None, refresh=False, raw_timestamps=False
+    ):
+        """
+        Rows of all hosts, each one with `host` column.
+
+        :param path: one of RESOURCES
+        :param filter: JMESPath expression, default one of resource if None
+        :param addresses: list of host addresses, all hosts if empty
+        :param refresh: if True do not answer from memory
+        :param raw_timestamps: keep dates as epoch seconds
+        :return: list of rows and dict with error of each failed host
+        """
+        resource = RESOURCES[path]
+        expression = filter or resource.default_filter
+        # bad filter is reported before any host is contacted
+        filter_get(expression)
+
+        addresses = list(dict.fromkeys(addresses or self.hosts))
+        unknown = [address for address in addresses if address not in self.hosts]
+        if unknown:
+            raise KeyError(", ".join(unknown))
+        sessions = [self.hosts[address] for address in addresses]
+
+        futures = [
+            self.executor.submit(session.get, resource.method, refresh)
+            for session in sessions
+        ]
+        rows = []
+        errors = {}
+        for session, future in zip(sessions, futures):
+            address = session.host.address
+            try:
+                data = future.result()
+            except Exception as e:
+                errors[address] = str(e) or type(e).__name__
+                continue
+            rows.extend(
+                writers.host_rows(
+                    address,
+                    rows_filter(
+                        data, expression, resource.timestamp_fields, raw_timestamps
+                    ),
+                )
+            )
+
+        return rows, errors
+
+    def health(self):
+        return {
+            "status": "ok",
+            "hosts": [
+                {"host": address, "logged_in": session.logged_in}
+                for address, session in self.hosts.items()
+            ],
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for session in self.hosts.values():
+            try:
+                session.close()
+            except Exception:
+                # server may be gone already, other sessions are still closed
+                pass
+
+
+def body_get(rows, format):
+    if format == "json":
+        return json.dumps(rows, default=str).encode()
+
+    stream = io.StringIO()
+    writer = writers.writer_get(format, stream)
+    writer.write_rows(rows)
+    writer.close()
+    return stream.getvalue().encode()
+
+
+def handler_get(daemon, verbose=0):
+    """
+    Request handler class answering queries with given Daemon.
+
+    GET one of RESOURCES with optional query parameters `filter`, `format`
+    (json, ndjson, csv), `host` (repeated for many), `refresh` and
+    `raw_timestamps`, or GET `/health`.
+
+    Requests are answered only if `Host` header is one of `allowed_hosts`
+    and `Authorization: Bearer` header has `token`, unless they are None.
+    """
+
+    class DaemonHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        allowed_hosts = None
+        token = None
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+        def address_string(self):
+            # client of unix socket has no address
+            return self.client_address[0] if self.client_address else "unix"
+
+        def respond(self, status_code, body, content_type, errors=None):
+            self.send_response(status_code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if errors:
+                self.send_header(ERRORS_HEADER, json.dumps(errors))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def respond_error(self, status_code, message):
+            body = json.dumps({"error": message}).encode()
+            self.respond(status_code, body, CONTENT_TYPES["json"])
+
+        def authorized(self):
+            if self.allowed_hosts is not None:
+                # page of other site resolved to loopback, DNS rebinding
+                if self.headers.get("Host", "").lower() not in self.allowed_hosts:
+                    self.respond_error(403, "Host header is not the listen address")
+                    return False
+            if self.token is not None:
+                scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+                if scheme.lower() != "bearer" or not hmac.compare_digest(
+                    token.strip().encode(), self.token.encode()
+                ):
+                    self.respond_error(401, "Bearer token is missing or wrong")
+                    return False
+            return True
+
+        def do_GET(self):
+            if not self.authorized():
+                return
+
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            path = url.path.rstrip("/") or "/"
+
+            if path == "/health":
+                body = json.dumps(daemon.health()).encode()
+                self.respond(200, body, CONTENT_TYPES["json"])
+                return
+            if path not in RESOURCES:
+                self.respond_error(404, "Unknown resource: {}".format(path))
+                return
+
+            format = params.get("format", ["json"])[-1]
+            if format not in CONTENT_TYPES:
+                self.respond_error(400, "Unsupported format: {}".format(format))
+                return
+
+            try:
+                rows, errors = daemon.query(
+                    path,
+                    params.get("filter", [None])[-1],
+                    params.get("host"),
+                    "refresh" in params,
+                    "raw_timestamps" in params,
+                )
+            except KeyError as e:
+                self.respond_error(404, "Unknown host: {}".format(e.args[0]))
+                return
+            except jmespath.exceptions.JMESPathError as e:
+                self.respond_error(400, str(e))
+                return
+
+            if errors and len(errors) == len(set(params.get("host") or daemon.hosts)):
+                body = json.dumps({"error": "All hosts failed", "hosts": errors})
+                self.respond(502, body.encode(), CONTENT_TYPES["json"], errors)
+                return
+
+            self.respond(200, body_get(rows, format), CONTENT_TYPES[format], errors)
+
+    return DaemonHandler
+
+
+def socket_remove(path):
+    """
+    Remove unix socket, e.g. left by daemon which has not been stopped
+    cleanly; any other file is never removed.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "File exists and is not a socket", path)
+
+    os.remove(path)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    bound = False
+
+    def server_bind(self):
+        socket_remove(self.server_address)
+        # only owner can query sessions kept by the daemon, socket is
+        # created with these permissions so nobody can connect before
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.server_bind(self)
+        finally:
+            os.umask(umask)
+        self.bound = True
+
+    def server_close(self):
+        super().server_close()
+        if self.bound:
+            try:
+                socket_remove(self.server_address)
+            except OSError:
+                pass
+
+
+def listen_parse(listen):
+    """
+    Split `host:port`, only loopback addresses are accepted as anyone who
+    can connect can query the servers.
+    """
+    address, _, port = listen.rpartition(":")
+    address = address.strip("[]") or "127.0.0.1"
+    if address != "localhost" and not ipaddress.ip_address(address).is_loopback:
+        raise ValueError("Only loopback address can be used: {}".format(address))
+
+    return address, int(port)
+
+
+def hosts_allowed(address, port):
+    """
+    Values of `Host` header which mean the listen address.
+    """
+    names = [address, "localhost"]
+    if ":" in address:
+        names = ["[{}]".format(address), "localhost"]
+
+    allowed = {"{}:{}".format(name, port).lower() for name in names}
+    if port == 80:
+        allowed.update(name.lower() for name in names)
+    return allowed
+
+
+def token_path_get(port, directory=None):
+    return os.path.join(directory or cache_dir(), "serve", "{}.token".format(port))
+
+
+def token_write(path):
+    """
+    New random token written to file readable only by current OS user.
+    """
+    token = secrets.token_urlsafe(32)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    os.replace(tmp_path, path)
+    return token
+
+
+class LoopbackHTTPServer(ThreadingHTTPServer):
+    token_path = None
+
+    def __init__(self, server_address, handler):
+        # read by TCPServer.__init__ when socket is created
+        self.address_family = (
+            socket.AF_INET6 if ":" in server_address[0] else socket.AF_INET
+        )
+        super().__init__(server_address, handler)
+
+    def server_close(self):
+        super().server_close()
+        if self.token_path is not None:
+            try:
+                os.remove(self.token_path)
+            except OSError:
+                pass
+
+
+def server_get(daemon, listen=None, socket_path=None, verbose=0, directory=None):
+    """
+    HTTP server answering queries with given Daemon, on unix socket if
+    `socket_path` is given, on loopback `host:port` otherwise.
+
+    Any local user and any web page resolved to loopback can connect to
+    `host:port`, so there requests need `Host` header with the listen
+    address and `Authorization: Bearer` header with token which is
+    written to `token_path` of the server for the time it runs.
+
+    :param directory: where token file is written, see diskcache.cache_dir()
+    """
+    handler = handler_get(daemon, verbose)
+    if socket_path:
+        return UnixHTTPServer(socket_path, handler)
+
+    address, port = listen_parse(listen or "127.0.0.1:8835")
+    http_server = LoopbackHTTPServer((address, port), handler)
+
+    # real port if 0 was given
+    port = http_server.server_address[1]
+    handler.allowed_hosts = hosts_allowed(address, port)
+    token_path = token_path_get(port, directory)
+    try:
+        handler.token = token_write(token_path)
+    except OSError:
+        http_server.server_close()
+        raise
+    http_server.token_path = token_path
+    return http_server
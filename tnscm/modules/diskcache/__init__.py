@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import platform
+import tempfile
+import time
+
+# default of get() telling missing entry apart from stored None, which
+# Nessus returns e.g. as `"scans": null` of server without scans
+MISSING = object()
+
+
+def cache_dir():
+    """
+    Directory where tnscm keeps its local data, `TNSCM_CACHE_DIR` if set.
+    """
+    if os.environ.get("TNSCM_CACHE_DIR"):
+        return os.environ["TNSCM_CACHE_DIR"]
+
+    if platform.system() == "Windows":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+        return os.path.join(base, "tnscm", "cache")
+    if platform.system() == "Darwin":
+        return os.path.expanduser(os.path.join("~", "Library", "Caches", "tnscm"))
+
+    base = os.environ.get(
+        "XDG_CACHE_HOME", os.path.expanduser(os.path.join("~", ".cache"))
+    )
+    return os.path.join(base, "tnscm")
+
+
+class DiskCache:
+
+    def __init__(self, ttl, refresh=False, max_size=100 * 1024 * 1024, directory=None):
+        """
+        :param ttl: number of seconds for which stored data is valid
+        :param refresh: if True never read stored data, only store new one
+        :param max_size: max number of bytes on disk, oldest used entries are
+                         removed above it
+        :param directory: where to store data, see cache_dir()
+        """
+        self.ttl = ttl
+        self.refresh = refresh
+        self.max_size = max_size
+        self.directory = os.path.join(directory or cache_dir(), "responses")
+
+    def path(self, host, resource):
+        key = "\0".join(
+            [str(host.address), str(host.port), str(host.username), resource]
+        )
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, host, resource, default=None):
+        """
+        Stored data for the host and resource or default if missing or
+        expired.
+        """
+        if self.refresh:
+            return default
+
+        path = self.path(host, resource)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return default
+
+        if time.time() - entry["created"] > self.ttl:
+            return default
+
+        # mark as recently used for eviction
+        os.utime(path)
+        return entry["data"]
+
+    def set(self, host, resource, data):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        entry = {
+            "created": time.time(),
+            "address": host.address,
+            "port": str(host.port),
+            "username": host.username,
+            "resource": resource,
+            "data": data,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self.path(host, resource))
+        self.evict()
+
+    def load(self, host, resources):
+        """
+        Stored data for all resources of the host or None if any is missing.
+        """
+        data = {}
+        for resource in resources:
+            data[resource] = self.get(host, resource, MISSING)
+            if data[resource] is MISSING:
+                return None
+
+        return data
+
+    def store(self, host, data):
+        for resource, value in data.items():
+            self.set(host, resource, value)
+
+    def evict(self):
+        """
+        Remove least recently used entries until cache fits in max_size.
+        """
+        evict(self.directory, self.max_size)
+
+
+def evict(directory, max_size):
+    """
+    Remove least recently used .json files of directory until they take
+    at most max_size bytes.
+    """
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".json"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
@@ -0,0 +1,429 @@
+from numbers import Number
+from tnscm import utilities
+
+jmespath = utilities.lazy_import("jmespath")
+jmespath_parser = utilities.lazy_import("jmespath.parser")
+
+
+class Unsupported(Exception):
+    """
+    Expression or data can not be handled by fast plan, jmespath is used.
+    """
+
+
+def is_number(value):
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def is_false(value):
+    # same as jmespath, 0 is true
+    return value == "" or value == [] or value == {} or value is None or value is False
+
+
+def equals(x, y):
+    # same as jmespath, 0 and 1 are not equal to False and True
+    if is_number(x) and x in (0, 1) and isinstance(y, bool):
+        return False
+    if is_number(y) and y in (0, 1) and isinstance(x, bool):
+        return False
+    return x == y
+
+
+def is_comparable(value):
+    return is_number(value) or isinstance(value, str)
+
+
+COMPARATORS = {
+    "eq": equals,
+    "ne": lambda x, y: not equals(x, y),
+    "lt": lambda x, y: x < y,
+    "gt": lambda x, y: x > y,
+    "lte": lambda x, y: x <= y,
+    "gte": lambda x, y: x >= y,
+}
+
+
+def plan_field(node):
+    name = node["value"]
+
+    def field(value):
+        try:
+            return value.get(name)
+        except AttributeError:
+            return None
+
+    return field
+
+
+def plan_subexpression(node):
+    steps = [plan(child) for child in node["children"]]
+
+    def subexpression(value):
+        for step in steps:
+            value = step(value)
+        return value
+
+    return subexpression
+
+
+def plan_literal(node):
+    literal = node["value"]
+    return lambda value: literal
+
+
+def plan_flatten(node):
+    left = plan(node["children"][0])
+
+    def flatten(value):
+        base = left(value)
+        if not isinstance(base, list):
+            return None
+        merged = []
+        for element in base:
+            if isinstance(element, list):
+                merged.extend(element)
+            else:
+                merged.append(element)
+        return merged
+
+    return flatten
+
+
+def fields_only(node):
+    """
+    Pairs of key and field name if multi select dict uses only plain fields.
+    """
+    if node["type"] != "multi_select_dict":
+        return None
+    pairs = []
+    for child in node["children"]:
+        value_node = child["children"][0]
+        if value_node["type"] != "field":
+            return None
+        pairs.append((child["value"], value_node["value"]))
+    return pairs
+
+
+def plan_projection(node):
+    left = plan(node["children"][0])
+    right_node = node["children"][1]
+
+    if right_node["type"] == "identity":
+
+        def projection_identity(value):
+            base = left(value)
+            if not isinstance(base, list):
+                return None
+            return [element for element in base if element is not None]
+
+        return projection_identity
+
+    pairs = fields_only(right_node)
+    if pairs is not None:
+        keys = [key for key, _ in pairs]
+
+        def projection_fields(value):
+            base = left(value)
+            if not isinstance(base, list):
+                return None
+            collected = []
+            for element in base:
+                if element is None:
+                    continue
+                try:
+                    get = element.get
+                except AttributeError:
+                    collected.append(dict.fromkeys(keys))
+                    continue
+                collected.append({key: get(name) for key, name in pairs})
+            return collected
+
+        return projection_fields
+
+    right = plan(right_node)
+
+    def projection(value):
+        base = left(value)
+        if not isinstance(base, list):
+            return None
+        collected = []
+        for element in base:
+            current = right(element)
+            if current is not None:
+                collected.append(current)
+        return collected
+
+    return projection
+
+
+def plan_filter_projection(node):
+    left = plan(node["children"][0])
+    right = plan(node["children"][1])
+    condition = plan(node["children"][2])
+    right_is_identity = node["children"][1]["type"] == "identity"
+
+    def filter_projection(value):
+        base = left(value)
+        if not isinstance(base, list):
+            return None
+        if right_is_identity:
+            return [
+                element
+                for element in base
+                if not is_false(condition(element)) and element is not None
+            ]
+        collected = []
+        for element in base:
+            if not is_false(condition(element)):
+                current = right(element)
+                if current is not None:
+                    collected.append(current)
+        return collected
+
+    return filter_projection
+
+
+def plan_multi_select_dict(node):
+    pairs = [(child["value"], plan(child["children"][0])) for child in node["children"]]
+
+    def multi_select_dict(value):
+        if value is None:
+            return None
+        return {key: step(value) for key, step in pairs}
+
+    return multi_select_dict
+
+
+def plan_multi_select_list(node):
+    steps = [plan(child) for child in node["children"]]
+
+    def multi_select_list(value):
+        if value is None:
+            return None
+        return [step(value) for step in steps]
+
+    return multi_select_list
+
+
+def plan_comparator(node):
+    compare = COMPARATORS[node["value"]]
+    left = plan(node["children"][0])
+    right = plan(node["children"][1])
+
+    if node["value"] in ("eq", "ne"):
+        return lambda value: compare(left(value), right(value))
+
+    def ordering(value):
+        x = left(value)
+        y = right(value)
+        if not (is_comparable(x) and is_comparable(y)):
+            return None
+        return compare(x, y)
+
+    return ordering
+
+
+def plan_and_expression(node):
+    left = plan(node["children"][0])
+    right = plan(node["children"][1])
+
+    def and_expression(value):
+        matched = left(value)
+        if is_false(matched):
+            return matched
+        return right(value)
+
+    return and_expression
+
+
+def plan_or_expression(node):
+    left = plan(node["children"][0])
+    right = plan(node["children"][1])
+
+    def or_expression(value):
+        matched = left(value)
+        if is_false(matched):
+            return right(value)
+        return matched
+
+    return or_expression
+
+
+def plan_not_expression(node):
+    child = plan(node["children"][0])
+
+    def not_expression(value):
+        result = child(value)
+        if is_number(result) and result == 0:
+            return False
+        return not result
+
+    return not_expression
+
+
+def plan_index(node):
+    index = node["value"]
+
+    def index_step(value):
+        if not isinstance(value, list):
+            return None
+        try:
+            return value[index]
+        except IndexError:
+            return None
+
+    return index_step
+
+
+def plan_contains(node):
+    subject, search = [plan(child) for child in node["children"]]
+
+    def contains(value):
+        found_in = subject(value)
+        if not isinstance(found_in, (str, list)):
+            raise Unsupported("contains")
+        searched = search(value)
+        if isinstance(found_in, str) and not isinstance(searched, str):
+            raise Unsupported("contains")
+        return searched in found_in
+
+    return contains
+
+
+def plan_starts_ends_with(node):
+    subject, affix = [plan(child) for child in node["children"]]
+    method = "startswith" if node["value"] == "starts_with" else "endswith"
+
+    def starts_ends_with(value):
+        text = subject(value)
+        part = affix(value)
+        if not (isinstance(text, str) and isinstance(part, str)):
+            raise Unsupported(node["value"])
+        return getattr(text, method)(part)
+
+    return starts_ends_with
+
+
+def plan_sort_by(node):
+    array_node, expref_node = node["children"]
+    if expref_node["type"] != "expref":
+        raise Unsupported("sort_by")
+    array = plan(array_node)
+    key = plan(expref_node["children"][0])
+
+    def sort_by(value):
+        items = array(value)
+        if not isinstance(items, list):
+            raise Unsupported("sort_by")
+        if not items:
+            return items
+        keys = [key(item) for item in items]
+        if all(isinstance(one_key, str) for one_key in keys):
+            pass
+        elif not all(is_number(one_key) for one_key in keys):
+            raise Unsupported("sort_by")
+        order = sorted(range(len(items)), key=keys.__getitem__)
+        return [items[position] for position in order]
+
+    return sort_by
+
+
+FUNCTIONS = {
+    "contains": (2, plan_contains),
+    "starts_with": (2, plan_starts_ends_with),
+    "ends_with": (2, plan_starts_ends_with),
+    "sort_by": (2, plan_sort_by),
+}
+
+
+def plan_function_expression(node):
+    if node["value"] not in FUNCTIONS:
+        raise Unsupported(node["value"])
+    arguments, planner = FUNCTIONS[node["value"]]
+    if len(node["children"]) != arguments:
+        raise Unsupported(node["value"])
+    return planner(node)
+
+
+PLANNERS = {
+    "identity": lambda node: lambda value: value,
+    "current": lambda node: lambda value: value,
+    "field": plan_field,
+    "subexpression": plan_subexpression,
+    "index_expression": plan_subexpression,
+    "pipe": plan_subexpression,
+    "literal": plan_literal,
+    "flatten": plan_flatten,
+    "projection": plan_projection,
+    "filter_projection": plan_filter_projection,
+    "multi_select_dict": plan_multi_select_dict,
+    "multi_select_list": plan_multi_select_list,
+    "comparator": plan_comparator,
+    "and_expression": plan_and_expression,
+    "or_expression": plan_or_expression,
+    "not_expression": plan_not_expression,
+    "index": plan_index,
+    "function_expression": plan_function_expression,
+}
+
+
+def plan(node):
+    planner = PLANNERS.get(node["type"])
+    if planner is None:
+        raise Unsupported(node["type"])
+    return planner(node)
+
+
+class Filter:
+
+    def __init__(self, expression):
+        """
+        JMESPath expression with fast path for common shapes like
+        `[].{id: id}`, `sort_by([], &id)[]` and `[? contains(name, 'x')]`.
+
+        Supported expressions are turned into specialized Python functions
+        once, instead of walking the syntax tree for every item. Anything
+        else, or data on which fast path would differ from jmespath (e.g.
+        type errors), is handled by jmespath itself.
+
+        :param expression: JMESPath expression
+        """
+        self.expression = expression
+        self.compiled = jmespath.compile(expression)
+        try:
+            self.fast = plan(self.compiled.parsed)
+        except Unsupported:
+            self.fast = None
+
+    def search(self, data):
+        if self.fast is not None:
+            try:
+                return self.fast(data)
+            except Unsupported:
+                pass
+
+        return self.compiled.search(data)
+
+
+def compile(expression):
+    return Filter(expression)
+
+
+def keys_get(node):
+    if node["type"] == "multi_select_dict":
+        return [child["value"] for child in node["children"]]
+    if node["type"] in ["projection", "filter_projection", "pipe"]:
+        return keys_get(node["children"][1])
+
+    return None
+
+
+def fields_get(expression):
+    """
+    Keys of every object given by expression, e.g. `id` and `name` of
+    `[].{id: id, name: name}`.
+
+    :return: list of keys, None if objects may have different keys or
+             result is not objects
+    """
+    return keys_get(jmespath.compile(expression).parsed)
@@ -0,0 +1,371 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tnscm import utilities
+from tnscm.modules import records
+from tnscm.modules import scansync
+from tnscm.modules import tracing
+from tnscm.modules.results import Host, HostResult
+from tnscm.modules.tnsapi import TnsApi, proxy_get
+
+# needed only for --engine asyncio
+asyncio = utilities.lazy_import("asyncio")
+asynctnsapi = utilities.lazy_import("tnscm.modules.asynctnsapi")
+
+
+def login(tnscon, host, sessions=None):
+    """
+    Login to the host or resume its stored session.
+    """
+    if sessions is not None:
+        token = sessions.get(host)
+        if token and tnscon.session_resume(token):
+            return
+        if token:
+            # expired token is not kept if login fails too
+            sessions.delete(host)
+    tnscon.login(host.username, host.password)
+    if sessions is not None:
+        sessions.set(host, tnscon._token)
+
+
+async def login_async(tnscon, host, sessions=None):
+    """
+    Login to the host or resume its stored session using AsyncTnsApi.
+    """
+    if sessions is not None:
+        token = sessions.get(host)
+        if token and await tnscon.session_resume(token):
+            return
+        if token:
+            # expired token is not kept if login fails too
+            sessions.delete(host)
+    await tnscon.login(host.username, host.password)
+    if sessions is not None:
+        sessions.set(host, tnscon._token)
+
+
+def logout(tnscon, sessions=None):
+    """
+    Logout and close connections, session is left open if it is stored.
+    """
+    if sessions is None:
+        tnscon.logout()
+    tnscon.close()
+
+
+def fetch_host(
+    host,
+    methods,
+    keep_session=False,
+    pool_size=10,
+    sessions=None,
+    timings=None,
+    api_options=None,
+    snapshots=None,
+    compact=False,
+):
+    """
+    Login to one host, call given TnsApi methods and logout.
+
+    :param sessions: SessionStore, if given stored session is reused and
+                     left open for the next run
+    :param timings: Timings, to record requests and phases of the host
+    :param api_options: dict with more TnsApi arguments, e.g. retries
+    :param snapshots: ScanSnapshots, if given `scans_get` asks Nessus only
+                      for scans changed since the previous run
+    :param compact: if True lists are kept as records.Record instead of
+                    dicts until they are used
+    """
+    host_timings = tracing.host_get(timings, host.address)
+    tnscon = TnsApi(
+        host.address,
+        host.port,
+        host.insecure,
+        pool_size=pool_size,
+        on_request=host_timings.request if timings else None,
+        **(api_options or {}),
+    )
+    try:
+        with host_timings.phase("login"):
+            login(tnscon, host, sessions)
+        data = {}
+        for method in methods:
+            with host_timings.phase("fetch"):
+                if snapshots is not None and method == "scans_get":
+                    data[method] = scansync.sync(
+                        snapshots, host, tnscon.scans_changed_get
+                    )
+                else:
+                    data[method] = getattr(tnscon, method)()
+    except Exception as e:
+        tnscon.close()
+        return HostResult(host, error=e)
+
+    if compact:
+        data = records.data_pack(data)
+
+    if not keep_session:
+        with host_timings.phase("logout"):
+            logout(tnscon, sessions)
+        tnscon = None
+
+    return HostResult(host, data, tnscon)
+
+
+async def fetch_host_async(
+    host,
+    methods,
+    sessions=None,
+    timings=None,
+    api_options=None,
+    snapshots=None,
+    compact=False,
+):
+    """
+    Login to one host, await given AsyncTnsApi methods and logout.
+    """
+    host_timings = tracing.host_get(timings, host.address)
+    tnscon = asynctnsapi.AsyncTnsApi(
+        host.address,
+        host.port,
+        host.insecure,
+        on_request=host_timings.request if timings else None,
+        **(api_options or {}),
+    )
+    try:
+        with host_timings.phase("login"):
+            await login_async(tnscon, host, sessions)
+        data = {}
+        for method in methods:
+            with host_timings.phase("fetch"):
+                if snapshots is not None and method == "scans_get":
+                    data[method] = await scansync.sync_async(
+                        snapshots, host, tnscon.scans_changed_get
+                    )
+                else:
+                    data[method] = await getattr(tnscon, method)()
+        if sessions is None:
+            with host_timings.phase("logout"):
+                await tnscon.logout()
+    except Exception as e:
+        return HostResult(host, error=e)
+    finally:
+        await tnscon.close()
+
+    if compact:
+        data = records.data_pack(data)
+
+    return HostResult(host, data)
+
+
+def fetch_asyncio(
+    hosts,
+    methods,
+    parallel=1,
+    sessions=None,
+    ordered=True,
+    timings=None,
+    api_options=None,
+    snapshots=None,
+    compact=False,
+):
+    """
+    Fetch data from many hosts using AsyncTnsApi on one event loop.
+
+    Event loop runs in background thread, so results can be yielded in the
+    order of given hosts while the rest is still being fetched.
+
+    :param hosts: list of Host
+    :param methods: list of AsyncTnsApi method names to call on each host
+    :param parallel: number of hosts to talk to at the same time
+    :param ordered: if False yield results as hosts complete
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    semaphore = asyncio.Semaphore(max(1, parallel))
+
+    async def fetch_host_limited(host):
+        async with semaphore:
+            return await fetch_host_async(
+                host, methods, sessions, timings, api_options, snapshots, compact
+            )
+
+    futures = [
+        asyncio.run_coroutine_threadsafe(fetch_host_limited(host), loop)
+        for host in hosts
+    ]
+    try:
+        for future in futures if ordered else as_completed(futures):
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def fetch_engine(
+    hosts,
+    methods,
+    parallel=1,
+    keep_session=False,
+    engine="threads",
+    sessions=None,
+    ordered=True,
+    timings=None,
+    api_options=None,
+    snapshots=None,
+    compact=False,
+):
+    """
+    Fetch data from many hosts using bounded pool of workers.
+
+    Results are yielded in the order of given hosts, each one as soon as it
+    and all hosts before it are done, so output stays stable while total
+    time is close to the time of the slowest host.
+
+    :param hosts: list of Host
+    :param methods: list of TnsApi method names to call on each host
+    :param parallel: number of hosts to talk to at the same time
+    :param keep_session: if True do not logout, HostResult.tnscon can be used
+    :param engine: `threads` or `asyncio`, asyncio is used only without
+                   keep_session as kept session is used synchronously and
+                   only if no host is reached through proxy, which
+                   AsyncTnsApi does not support
+    :param sessions: SessionStore to reuse sessions between runs
+    :param ordered: if False yield results as hosts complete, so output of
+                    fast hosts does not wait for slow ones
+    :param timings: Timings, to record requests and phases of each host
+    :param api_options: dict with more TnsApi arguments, e.g. retries
+    :param snapshots: ScanSnapshots, to fetch only changed scans
+    :param compact: if True lists are returned as records.Record, which
+                    take less memory while results wait to be printed
+    """
+    if (
+        engine == "asyncio"
+        and not keep_session
+        and not any(proxy_get(host.address, host.port) for host in hosts)
+    ):
+        yield from fetch_asyncio(
+            hosts,
+            methods,
+            parallel,
+            sessions,
+            ordered,
+            timings,
+            api_options,
+            snapshots,
+            compact,
+        )
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, parallel))
+    # kept session may be used later by as many workers as hosts were
+    pool_size = max(10, parallel)
+    futures = [
+        executor.submit(
+            fetch_host,
+            host,
+            methods,
+            keep_session,
+            pool_size,
+            sessions,
+            timings,
+            api_options,
+            snapshots,
+            compact,
+        )
+        for host in hosts
+    ]
+    try:
+        for future in futures if ordered else as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch(
+    hosts,
+    methods,
+    parallel=1,
+    keep_session=False,
+    engine="threads",
+    cache=None,
+    sessions=None,
+    ordered=True,
+    timings=None,
+    api_options=None,
+    snapshots=None,
+    compact=False,
+):
+    """
+    Fetch data from many hosts, see fetch_engine().
+
+    :param cache: DiskCache, hosts which have all methods stored there are
+                  not contacted at all, not used with keep_session
+    :param sessions: SessionStore to reuse sessions between runs
+    :param ordered: if False yield results as hosts complete, cached ones
+                    first
+    :param timings: Timings, to record requests and phases of each host
+    :param api_options: dict with more TnsApi arguments, e.g. retries
+    :param snapshots: ScanSnapshots, to fetch only changed scans
+    :param compact: if True lists are returned as records.Record
+    """
+    if cache is None or keep_session or not methods:
+        yield from fetch_engine(
+            hosts,
+            methods,
+            parallel,
+            keep_session,
+            engine,
+            sessions,
+            ordered,
+            timings,
+            api_options,
+            snapshots,
+            compact,
+        )
+        return
+
+    cached = []
+    for host in hosts:
+        with tracing.host_get(timings, host.address).phase("cache"):
+            data = cache.load(host, methods)
+        cached.append(records.data_pack(data) if compact and data else data)
+    missing = [host for host, data in zip(hosts, cached) if data is None]
+    results = fetch_engine(
+        missing,
+        methods,
+        parallel,
+        keep_session,
+        engine,
+        sessions,
+        ordered,
+        timings,
+        api_options,
+        snapshots,
+        compact,
+    )
+
+    if not ordered:
+        for host, data in zip(hosts, cached):
+            if data is not None:
+                yield HostResult(host, data)
+        for result in results:
+            if result.error is None:
+                cache.store(result.host, records.data_unpack(result.data))
+            yield result
+        return
+
+    for host, data in zip(hosts, cached):
+        if data is not None:
+            yield HostResult(host, data)
+            continue
+
+        result = next(results)
+        if result.error is None:
+            cache.store(host, records.data_unpack(result.data))
+        yield result
@@ -0,0 +1,157 @@
+import csv
+import os
+from collections import namedtuple
+
+Entry = namedtuple("Entry", ["address", "port", "username", "credential", "insecure"])
+
+COLUMNS = Entry._fields
+
+# where password of the host is read from, e.g. `env:NESSUS_PASSWORD`
+CREDENTIAL_SCHEMES = ["env", "keyring"]
+
+TRUE = ["true", "yes", "y", "1"]
+FALSE = ["false", "no", "n", "0", ""]
+
+
+class HostsFileError(ValueError):
+
+    def __init__(self, path, message, number=None):
+        """
+        Hosts file can't be read or one of its entries is not valid.
+
+        :param path: hosts file
+        :param number: position of the host in the file, from 1
+        """
+        if number is None:
+            super().__init__("{}: {}".format(path, message))
+        else:
+            super().__init__("{}, entry {}: {}".format(path, number, message))
+        self.path = path
+        self.number = number
+
+
+def flag_get(value):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    if str(value).strip().lower() in TRUE:
+        return True
+    if str(value).strip().lower() in FALSE:
+        return False
+
+    raise ValueError("insecure should be true or false, not {!r}".format(value))
+
+
+def entry_get(item, port, username, insecure):
+    """
+    Entry out of one host of the file, empty values are taken from
+    command line options.
+
+    :param item: dict with COLUMNS as keys or only address string
+    """
+    if isinstance(item, str):
+        item = {"address": item}
+    if not isinstance(item, dict):
+        raise ValueError("host should be address or mapping, not {!r}".format(item))
+
+    unknown = sorted(set(item) - set(COLUMNS))
+    if unknown:
+        raise ValueError("unknown keys: {}".format(", ".join(map(str, unknown))))
+
+    address = str(item.get("address") or "").strip()
+    if not address:
+        raise ValueError("address is missing")
+
+    one_port = str(item.get("port") or port).strip()
+    if not one_port.isdigit():
+        raise ValueError("port should be a number, not {!r}".format(one_port))
+
+    credential = item.get("credential") or None
+    if credential is not None:
+        scheme, _, name = str(credential).partition(":")
+        if scheme not in CREDENTIAL_SCHEMES or (scheme == "env" and not name):
+            raise ValueError(
+                "credential should be env:VARIABLE or keyring[:SERVICE], "
+                "not {!r}".format(credential)
+            )
+
+    one_insecure = item.get("insecure")
+    return Entry(
+        address,
+        one_port,
+        str(item.get("username") or username),
+        credential,
+        insecure if one_insecure in (None, "") else flag_get(one_insecure),
+    )
+
+
+def items_yaml(f):
+    # PyYAML is optional, needed only for YAML files
+    import yaml
+
+    data = yaml.safe_load(f)
+    if isinstance(data, dict):
+        data = data.get("hosts")
+    if data is None:
+        return []
+    if not isinstance(data, list):
+        raise ValueError("file should have list of hosts or `hosts:` list")
+
+    return data
+
+
+def items_csv(f):
+    lines = (line for line in f if line.strip() and not line.lstrip().startswith("#"))
+    reader = csv.DictReader(lines, skipinitialspace=True)
+    if reader.fieldnames is None or "address" not in reader.fieldnames:
+        raise ValueError("first line should be header with address column")
+
+    return [
+        {key: value for key, value in row.items() if value is not None}
+        for row in reader
+    ]
+
+
+def load(path, port="443", username=None, insecure=False):
+    """
+    Hosts listed in YAML or CSV file, each one with its own port, user,
+    credential reference and insecure flag.
+
+    YAML file is list of hosts or mapping with `hosts` list, CSV file has
+    header line with COLUMNS. Only address is required, other values are
+    taken from command line options.
+
+    :param path: file ending with .yaml, .yml or .csv
+    :param port: port of hosts which do not have one
+    :param username: user of hosts which do not have one
+    :param insecure: insecure flag of hosts which do not have one
+    :return: list of Entry in order of the file
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in [".yaml", ".yml"]:
+        items_get = items_yaml
+    elif extension == ".csv":
+        items_get = items_csv
+    else:
+        raise HostsFileError(path, "hosts file should be .yaml, .yml or .csv")
+
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            items = items_get(f)
+    except OSError as e:
+        raise HostsFileError(path, e.strerror or str(e))
+    except ImportError:
+        raise HostsFileError(
+            path, "PyYAML is needed for YAML hosts file, pip install tnscm[yaml]"
+        )
+    except Exception as e:
+        # yaml.YAMLError, csv.Error or wrong structure of the file
+        raise HostsFileError(path, str(e))
+
+    entries = []
+    for number, item in enumerate(items, start=1):
+        try:
+            entries.append(entry_get(item, port, username, insecure))
+        except ValueError as e:
+            raise HostsFileError(path, str(e), number)
+
+    return entries
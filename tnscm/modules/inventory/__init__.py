@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import time
+from tnscm import utilities
+from tnscm.modules.diskcache import cache_dir
+from tnscm.modules.results import HostResult
+
+jmespath_parser = utilities.lazy_import("jmespath.parser")
+
+# TnsApi methods whose lists are stored, with names shown by `tnscm sync`
+METHODS = {
+    "scans_get": "scans",
+    "policies_get": "policies",
+    "users_get": "users",
+    "plugins_families_get": "plugin families",
+    "settings_advanced_get": "settings",
+}
+
+# item keys copied to own indexed columns, filters comparing them with
+# literal are answered by index instead of reading all items
+INDEXED = ["id", "name", "owner", "status", "username"]
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS syncs ("
+    "host TEXT, method TEXT, port TEXT, synced REAL, is_null INTEGER, "
+    "PRIMARY KEY (host, method))",
+    # columns without type keep numbers and strings as they are in JSON
+    "CREATE TABLE IF NOT EXISTS items ("
+    "host TEXT, method TEXT, position INTEGER, {}, data TEXT)".format(
+        ", ".join(INDEXED)
+    ),
+    "CREATE INDEX IF NOT EXISTS items_host ON items (method, host, position)",
+] + [
+    "CREATE INDEX IF NOT EXISTS items_{0} ON items (method, {0})".format(column)
+    for column in INDEXED
+]
+
+
+class NotSyncedError(Exception):
+
+    def __init__(self, address, method):
+        """
+        Inventory has no data of the host, `tnscm sync` was not run for it.
+        """
+        super().__init__(
+            "No {} of {} in inventory. Please run tnscm sync first.".format(
+                METHODS.get(method, method), address
+            )
+        )
+        self.address = address
+        self.method = method
+
+
+def database_path():
+    return os.path.join(cache_dir(), "inventory.sqlite3")
+
+
+def indexed_value(item, column):
+    value = item.get(column) if isinstance(item, dict) else None
+    if isinstance(value, (str, int, float)):
+        return value
+
+    return None
+
+
+def conditions_get(expression):
+    """
+    Indexed columns and values which items returned by JMESPath expression
+    must have, e.g. `{"status": "running"}` for `[?status == 'running']`.
+
+    Only `==` of indexed key and string or number literal, joined with
+    `&&`, is recognized; expression itself is still applied to the items,
+    so anything else just reads all items of the host.
+    """
+    if not expression:
+        return {}
+    try:
+        node = jmespath_parser.Parser().parse(expression).parsed
+    except Exception:
+        return {}
+
+    while node["type"] == "pipe":
+        node = node["children"][0]
+    if node["type"] != "filter_projection" or node["children"][0]["type"] != "identity":
+        return {}
+
+    conditions = {}
+    comparators = [node["children"][2]]
+    while comparators:
+        comparator = comparators.pop()
+        if comparator["type"] == "and_expression":
+            comparators.extend(comparator["children"])
+            continue
+        if comparator["type"] != "comparator" or comparator["value"] != "eq":
+            continue
+        left, right = comparator["children"]
+        if left["type"] == "literal":
+            left, right = right, left
+        if left["type"] != "field" or right["type"] != "literal":
+            continue
+        value = right["value"]
+        if left["value"] in INDEXED and type(value) in (str, int, float):
+            conditions[left["value"]] = value
+
+    return conditions
+
+
+class Inventory:
+
+    def __init__(self, path=None):
+        """
+        Lists of all hosts stored in local SQLite database by `tnscm sync`,
+        so they can be queried without talking to Nessus.
+
+        :param path: database file, `inventory.sqlite3` in
+                     diskcache.cache_dir() if not given
+        """
+        self.path = path or database_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+    def store(self, host, method, data):
+        """
+        Replace stored list of the host with given one, in one transaction.
+        """
+        items = data or []
+        rows = (
+            [host.address, method, position]
+            + [indexed_value(item, column) for column in INDEXED]
+            + [json.dumps(item)]
+            for position, item in enumerate(items)
+        )
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM items WHERE method = ? AND host = ?",
+                (method, host.address),
+            )
+            self.connection.executemany(
+                "INSERT INTO items VALUES ({})".format(
+                    ", ".join("?" * (len(INDEXED) + 4))
+                ),
+                rows,
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?, ?)",
+                (host.address, method, str(host.port), time.time(), data is None),
+            )
+
+    def load(self, address, method, conditions=None):
+        """
+        Stored list of the host, only items with given indexed values.
+
+        :return: list of items, None if Nessus returned none
+        """
+        synced = self.connection.execute(
+            "SELECT is_null FROM syncs WHERE host = ? AND method = ?",
+            (address, method),
+        ).fetchone()
+        if synced is None:
+            raise NotSyncedError(address, method)
+
+        where = "".join(" AND {} = ?".format(column) for column in conditions or {})
+        rows = self.connection.execute(
+            "SELECT data FROM items WHERE method = ? AND host = ?{} "
+            "ORDER BY position".format(where),
+            [method, address] + list((conditions or {}).values()),
+        )
+        items = [json.loads(data) for (data,) in rows]
+        if not items and synced[0]:
+            return None
+
+        return items
+
+    def fetch(self, hosts, methods, filter=None):
+        """
+        Stored data of many hosts, in the same form as fleet.fetch().
+
+        :param hosts: list of Host
+        :param methods: list of METHODS
+        :param filter: JMESPath expression which will be applied to the
+                       data, used only to read less items
+        """
+        conditions = conditions_get(filter)
+        for host in hosts:
+            try:
+                data = {
+                    method: self.load(host.address, method, conditions)
+                    for method in methods
+                }
+            except NotSyncedError as e:
+                yield HostResult(host, error=e)
+                continue
+            yield HostResult(host, data)
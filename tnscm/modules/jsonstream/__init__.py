@@ -0,0 +1,121 @@
+import codecs
+import json
+
+WHITESPACE = " \t\n\r"
+NUMBER = "0123456789.eE+-"
+
+decoder = json.JSONDecoder()
+
+
+class Reader:
+
+    def __init__(self, chunks):
+        """
+        JSON text read chunk by chunk, only the part which has not been
+        decoded yet is kept in memory.
+
+        :param chunks: iterable of bytes, e.g. Response.iter_content()
+        """
+        self.chunks = iter(chunks)
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+
+    def fill(self):
+        """
+        Read next chunk, False if there are no more.
+        """
+        for chunk in self.chunks:
+            text = self.text_decoder.decode(chunk)
+            if text:
+                self.buffer = self.buffer[self.position :] + text
+                self.position = 0
+                return True
+
+        return False
+
+    def drain(self):
+        # rest of response is read, so connection can be used again
+        for _ in self.chunks:
+            pass
+
+    def peek(self):
+        """
+        Next character which is not whitespace, None at the end of text.
+        """
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position] in WHITESPACE
+            ):
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return None
+
+    def expect(self, characters):
+        character = self.peek()
+        if character is None or character not in characters:
+            raise ValueError(
+                "Expected one of {!r}, got {!r}".format(characters, character)
+            )
+        self.position += 1
+        return character
+
+    def value(self):
+        """
+        Decode one whole JSON value, reading more chunks until it is complete.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            if (
+                isinstance(value, (int, float))
+                and not self.buffer[end:].strip(NUMBER)
+                and self.fill()
+            ):
+                # number may continue in the next chunk, e.g. `12` of `12.5`
+                continue
+            self.position = end
+            return value
+
+
+def array_items(chunks, key):
+    """
+    Items of array under `key` of JSON object, decoded one by one as the
+    text is read, e.g. scans of `{"folders": [], "scans": [...]}`.
+
+    Nothing is yielded if key is missing or its value is null.
+
+    :param chunks: iterable of bytes
+    :param key: name of the array in top level object
+    """
+    reader = Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                break
+            while True:
+                yield reader.value()
+                if reader.expect(",]") == "]":
+                    break
+            break
+
+        reader.value()
+        if reader.expect(",}") == "}":
+            break
+
+    reader.drain()
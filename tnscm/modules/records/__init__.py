@@ -0,0 +1,205 @@
+import sys
+
+_MISSING = object()
+
+# key order of items, the same tuple is shared by all records having it
+_key_orders = {}
+
+
+class Record:
+    """
+    Item of Nessus API list kept in slots instead of dict, which takes
+    a fraction of dict memory when thousands of items are held at once.
+
+    Keys not known to the class are kept in `extra` dict and order of keys
+    is remembered, so record is turned back into the same dict. Repeated
+    strings, e.g. status or owner, are shared between records.
+    """
+
+    __slots__ = ("_keys", "_extra")
+    FIELDS = ()
+    # fields whose values repeat between items, stored once with sys.intern
+    INTERNED = ()
+    _fields = frozenset()
+    _interned = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # sets are checked for every key of every item
+        cls._fields = frozenset(cls.FIELDS)
+        cls._interned = frozenset(cls.INTERNED)
+
+    def __init__(self, data):
+        """
+        :param data: dict as returned by Nessus API
+        """
+        fields = self._fields
+        interned = self._interned
+        extra = None
+        for key, value in data.items():
+            if key in fields:
+                if key in interned and type(value) is str:
+                    value = sys.intern(value)
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self._extra = extra
+        keys = tuple(data)
+        self._keys = _key_orders.setdefault(keys, keys)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def to_dict(self):
+        """
+        Dict equal to the one given to record, with the same order of keys.
+        """
+        extra = self._extra
+        return {
+            key: (
+                extra[key] if extra is not None and key in extra else getattr(self, key)
+            )
+            for key in self._keys
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, self.to_dict())
+
+
+class Scan(Record):
+    FIELDS = (
+        "folder_id",
+        "id",
+        "name",
+        "owner",
+        "creation_date",
+        "last_modification_date",
+        "status",
+        "shared",
+        "enabled",
+        "read",
+        "rrules",
+        "timezone",
+        "starttime",
+        "control",
+        "type",
+        "user_permissions",
+        "uuid",
+        "schedule_uuid",
+        "legacy",
+        "permissions",
+        "live_results",
+    )
+    INTERNED = ("owner", "status", "type", "timezone", "rrules")
+    __slots__ = FIELDS
+
+
+class Policy(Record):
+    FIELDS = (
+        "id",
+        "name",
+        "owner",
+        "creation_date",
+        "last_modification_date",
+        "description",
+        "visibility",
+        "shared",
+        "user_permissions",
+        "template_uuid",
+        "is_scap",
+        "has_credentials",
+        "no_target",
+        "plugin_filters",
+        "owner_id",
+    )
+    INTERNED = ("owner", "visibility", "template_uuid")
+    __slots__ = FIELDS
+
+
+class User(Record):
+    FIELDS = (
+        "id",
+        "username",
+        "name",
+        "email",
+        "permissions",
+        "type",
+        "login_fail_count",
+        "login_fail_total",
+        "lastlogin",
+        "last_login_attempt",
+        "enabled",
+        "container_id",
+        "user_permissions",
+        "uuid",
+    )
+    INTERNED = ("type",)
+    __slots__ = FIELDS
+
+
+class PluginFamily(Record):
+    FIELDS = ("id", "name", "count")
+    __slots__ = FIELDS
+
+
+# TnsApi method names with record class of their items
+RECORDS = {
+    "scans_get": Scan,
+    "policies_get": Policy,
+    "users_get": User,
+    "plugins_families_get": PluginFamily,
+}
+
+
+def pack(method, items):
+    """
+    Records of items returned by TnsApi method, items as they are if the
+    method has no record class or items are not a list of dicts.
+    """
+    record_class = RECORDS.get(method)
+    if record_class is None or not isinstance(items, list):
+        return items
+
+    return [record_class(item) if isinstance(item, dict) else item for item in items]
+
+
+def unpack(items):
+    """
+    Dicts of records, e.g. for JMESPath and writers; anything else is
+    returned as it is.
+    """
+    if not isinstance(items, list):
+        return items
+
+    return [item.to_dict() if isinstance(item, Record) else item for item in items]
+
+
+def data_pack(data):
+    """
+    Pack each value of HostResult.data, dict with TnsApi method as key.
+    """
+    return {method: pack(method, items) for method, items in data.items()}
+
+
+def data_unpack(data):
+    return {method: unpack(items) for method, items in data.items()}
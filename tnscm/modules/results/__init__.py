@@ -0,0 +1,30 @@
+from collections import namedtuple
+
+Host = namedtuple("Host", ["address", "port", "username", "password", "insecure"])
+
+
+class HostResult:
+
+    def __init__(self, host, data=None, tnscon=None, error=None):
+        """
+        :param host: Host for which data has been fetched
+        :param data: dict with TnsApi method name as key and its result as value
+        :param tnscon: logged in TnsApi, only if session has been kept
+        :param error: exception raised while talking to the host
+        """
+        self.host = host
+        self.data = data or {}
+        self.tnscon = tnscon
+        self.error = error
+
+
+class Filtered:
+
+    def __init__(self, value):
+        """
+        Data already filtered by worker process of `--workers`, data_filter()
+        of the CLI returns the value as it is.
+
+        :param value: result of the filter
+        """
+        self.value = value
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tnscm.modules.diskcache import cache_dir
+from tnscm.modules.diskcache import evict
+
+Job = namedtuple("Job", ["tnscon", "host", "scan_id", "last_modification_date"])
+
+
+class DetailStore:
+
+    def __init__(self, ttl, refresh=False, max_size=100 * 1024 * 1024, directory=None):
+        """
+        Keeps scan details records of each host on disk between tnscm runs,
+        with `last_modification_date` of the scan they were fetched for.
+
+        :param ttl: number of seconds for which stored record is used
+        :param refresh: if True never read stored records, only store new ones
+        :param max_size: max number of bytes on disk, files of least recently
+                         used hosts are removed above it
+        :param directory: where to store records, see diskcache.cache_dir()
+        """
+        self.ttl = ttl
+        self.refresh = refresh
+        self.max_size = max_size
+        self.directory = os.path.join(directory or cache_dir(), "details")
+
+    def path(self, host):
+        key = "\0".join([str(host.address), str(host.port), str(host.username)])
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, host):
+        """
+        Dict with scan id as key and stored entry as value, without entries
+        older than ttl.
+        """
+        if self.refresh:
+            return {}
+        path = self.path(host)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+
+        # mark as recently used for eviction
+        os.utime(path)
+        now = time.time()
+        return {
+            scan_id: entry
+            for scan_id, entry in entries.items()
+            if isinstance(entry, dict) and now - entry.get("stored", 0) <= self.ttl
+        }
+
+    def set(self, host, entries):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self.path(host)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+        evict(self.directory, self.max_size)
+
+
+def record_get(scan_id, details, last_modification_date=None):
+    """
+    One row about scan out of `/scans/{id}` response.
+    """
+    info = details.get("info") or {}
+    history = details.get("history") or []
+    start = info.get("scan_start")
+    end = info.get("scan_end")
+
+    return {
+        "id": scan_id,
+        "name": info.get("name"),
+        "status": info.get("status"),
+        "policy": info.get("policy"),
+        "targets": info.get("targets"),
+        "host_count": info.get("hostcount", len(details.get("hosts") or [])),
+        "scan_start": start,
+        "scan_end": end,
+        "duration": end - start if start and end else None,
+        "last_modification_date": last_modification_date,
+        "history_count": len(history),
+        "history": [
+            {
+                "history_id": entry.get("history_id"),
+                "status": entry.get("status"),
+                "creation_date": entry.get("creation_date"),
+                "last_modification_date": entry.get("last_modification_date"),
+            }
+            for entry in history
+        ],
+    }
+
+
+def unchanged(entry, job):
+    return (
+        entry is not None
+        and job.last_modification_date is not None
+        and entry.get("last_modification_date") == job.last_modification_date
+    )
+
+
+def fetch_one(job):
+    details = job.tnscon.scan_details_get(job.scan_id)
+    return record_get(job.scan_id, details, job.last_modification_date)
+
+
+def fetch(jobs, store=None, parallel=1):
+    """
+    Details of many scans of many hosts, `parallel` of them fetched at
+    the same time.
+
+    Scans not modified since their record was stored are not fetched
+    again, their stored record is yielded first.
+
+    :param jobs: list of Job
+    :param store: DetailStore, nothing is skipped or stored if None
+    :return: generator of (job, record, error) as each scan is done,
+             record is None if error is not
+    """
+    stored = {}
+    if store is not None:
+        for job in jobs:
+            if job.host not in stored:
+                stored[job.host] = store.get(job.host)
+
+    pending = []
+    for job in jobs:
+        entry = stored.get(job.host, {}).get(str(job.scan_id))
+        if unchanged(entry, job):
+            yield job, entry["record"], None
+        else:
+            pending.append(job)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, parallel))
+    futures = {executor.submit(fetch_one, job): job for job in pending}
+    try:
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                yield job, None, e
+                continue
+            if store is not None:
+                stored[job.host][str(job.scan_id)] = {
+                    "stored": time.time(),
+                    "last_modification_date": job.last_modification_date,
+                    "record": record,
+                }
+            yield job, record, None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        # records fetched so far are kept even if output was stopped
+        for host, entries in stored.items():
+            store.set(host, entries)
@@ -0,0 +1,268 @@
+import heapq
+import itertools
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+FORMATS = ["nessus", "csv", "html"]
+
+# Nessus does not export html without chapters
+CHAPTERS = {"html": "vuln_hosts_summary"}
+
+EXPORTED = "exported"
+FAILED = "failed"
+
+Job = namedtuple("Job", ["tnscon", "address", "scan_id", "scan_name"])
+
+
+def file_name(address, scan_id, scan_name, format):
+    name = re.sub(r"[^\w.-]+", "_", str(scan_name or "")).strip("_")
+    return "{}_{}_{}.{}".format(address, scan_id, name or "scan", format)
+
+
+class Pending:
+
+    def __init__(self, key, job, file_id, delay):
+        """
+        Export requested from Nessus and not ready yet.
+
+        :param key: anything identifying the export for the caller
+        :param job: Job
+        :param file_id: file id returned by Nessus for the export
+        :param delay: seconds to wait before the next status check
+        """
+        self.key = key
+        self.job = job
+        self.file_id = file_id
+        self.delay = delay
+        self.added = time.monotonic()
+        self.errors = 0
+
+
+class ExportPoller:
+
+    def __init__(
+        self,
+        on_ready,
+        on_failed,
+        initial_delay=0.5,
+        max_delay=30.0,
+        factor=2.0,
+        timeout=3600,
+        max_errors=5,
+        workers=4,
+    ):
+        """
+        Tracks many exports being prepared by Nessus at once and checks
+        their status with exponential backoff, from `initial_delay` up to
+        `max_delay` seconds with random jitter, so many exports do not poll
+        the same server at the same moment.
+
+        Backoff adapts to each server: first check of new export is delayed
+        by part of the time which exports of the same server needed so far,
+        so long exports are not polled in vain from the start.
+
+        :param on_ready: called with (key, job, file_id) when export is ready,
+                         from poller thread so it should not block
+        :param on_failed: called with (key, job, detail) when export failed
+        :param initial_delay: seconds before the first status check `0.5`
+        :param max_delay: max seconds between status checks `30`
+        :param factor: delay is multiplied by it after each not ready status
+        :param timeout: seconds after which export is given up `3600`
+        :param max_errors: number of failed status checks in a row after
+                           which export is given up `5`
+        :param workers: number of status checks sent at the same time `4`
+        """
+        self.on_ready = on_ready
+        self.on_failed = on_failed
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.timeout = timeout
+        self.max_errors = max_errors
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._ready_seconds = {}
+        self._closed = False
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _first_delay(self, address):
+        estimate = self._ready_seconds.get(address)
+        if estimate is None:
+            return self.initial_delay
+
+        return min(self.max_delay, max(self.initial_delay, estimate / 2))
+
+    def _schedule(self, pending):
+        jitter = random.uniform(0.8, 1.2)
+        due = time.monotonic() + pending.delay * jitter
+        heapq.heappush(self._heap, (due, next(self._counter), pending))
+        self._condition.notify()
+
+    def add(self, key, job, file_id):
+        """
+        Start tracking export which Nessus is preparing.
+        """
+        with self._condition:
+            pending = Pending(key, job, file_id, self._first_delay(job.address))
+            self._schedule(pending)
+
+    def _check(self, pending):
+        try:
+            status = pending.job.tnscon.scan_export_status(
+                pending.job.scan_id, pending.file_id
+            )
+        except Exception as e:
+            pending.errors += 1
+            if pending.errors >= self.max_errors:
+                self.on_failed(pending.key, pending.job, str(e) or type(e).__name__)
+                return
+            status = None
+        else:
+            pending.errors = 0
+
+        elapsed = time.monotonic() - pending.added
+        if status == "ready":
+            with self._condition:
+                previous = self._ready_seconds.get(pending.job.address, elapsed)
+                self._ready_seconds[pending.job.address] = (previous + elapsed) / 2
+            self.on_ready(pending.key, pending.job, pending.file_id)
+        elif status == "error":
+            self.on_failed(pending.key, pending.job, "Export failed on Nessus")
+        elif elapsed > self.timeout:
+            self.on_failed(
+                pending.key,
+                pending.job,
+                "Export not ready in {} s".format(self.timeout),
+            )
+        else:
+            with self._condition:
+                pending.delay = min(self.max_delay, pending.delay * self.factor)
+                self._schedule(pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self._heap:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                due, _, pending = self._heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+            self._executor.submit(self._check, pending)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+
+def report_get(job, outcome=FAILED, path="", size=0, detail=""):
+    return {
+        "host": job.address,
+        "id": job.scan_id,
+        "name": job.scan_name,
+        "outcome": outcome,
+        "path": path,
+        "bytes": size,
+        "detail": detail,
+    }
+
+
+def error_detail(e):
+    return str(e) or type(e).__name__
+
+
+def export(jobs, format, directory, parallel=1, progress=None, poller=None):
+    """
+    Export many scans of many hosts at the same time.
+
+    Export of each scan is requested by pool of `parallel` workers, then
+    tracked by ExportPoller and, as soon as it is ready, downloaded by
+    another pool of `parallel` workers, so slow exports do not hold back
+    the ready ones.
+
+    :param jobs: list of Job
+    :param format: one of FORMATS
+    :param directory: where exported files are written
+    :param parallel: number of exports requested and downloaded at the same time
+    :param progress: callable called with (done, total, report) after each scan
+    :param poller: dict with ExportPoller options, e.g. `max_delay`
+    :return: list of reports in the order of given jobs
+    """
+    os.makedirs(directory, exist_ok=True)
+    finished = queue.Queue()
+
+    def download(number, job, file_id):
+        path = os.path.join(
+            directory, file_name(job.address, job.scan_id, job.scan_name, format)
+        )
+        try:
+            size = job.tnscon.scan_export_download(job.scan_id, file_id, path)
+        except Exception as e:
+            finished.put((number, report_get(job, detail=error_detail(e))))
+            return
+        finished.put((number, report_get(job, EXPORTED, path, size)))
+
+    def request(number, job):
+        try:
+            file_id = job.tnscon.scan_export_request(
+                job.scan_id, format, CHAPTERS.get(format)
+            )["file"]
+        except Exception as e:
+            finished.put((number, report_get(job, detail=error_detail(e))))
+            return
+        export_poller.add(number, job, file_id)
+
+    def on_ready(number, job, file_id):
+        downloads.submit(download, number, job, file_id)
+
+    def on_failed(number, job, detail):
+        finished.put((number, report_get(job, detail=detail)))
+
+    reports = {}
+    downloads = ThreadPoolExecutor(max_workers=max(1, parallel))
+    export_poller = ExportPoller(
+        on_ready, on_failed, workers=max(1, parallel), **(poller or {})
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as requests:
+            for number, job in enumerate(jobs):
+                requests.submit(request, number, job)
+
+            while len(reports) < len(jobs):
+                number, report = finished.get()
+                reports[number] = report
+                if progress:
+                    progress(len(reports), len(jobs), report)
+    finally:
+        export_poller.close()
+        downloads.shutdown(wait=True)
+
+    return [reports[number] for number in range(len(jobs))]
+
+
+def summary(reports):
+    """
+    Count reports by outcome.
+    """
+    counts = {EXPORTED: 0, FAILED: 0}
+    for report in reports:
+        counts[report["outcome"]] += 1
+
+    return counts
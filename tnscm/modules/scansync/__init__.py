@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import time
+from tnscm.modules.diskcache import cache_dir
+
+# scans changed this many seconds before the previous sync are asked for
+# again, so scans saved by Nessus while it was building the list are not missed
+OVERLAP = 60
+
+# without full list deleted scans would stay in the snapshot forever
+FULL_EVERY = 86400
+
+
+class ScanSnapshots:
+
+    def __init__(self, full_every=FULL_EVERY, full=False, directory=None):
+        """
+        Keeps scan list of each host on disk between tnscm runs, with
+        the server time of the last sync, so next run asks Nessus only for
+        scans changed since then.
+
+        Nessus does not report deleted scans in changes, so the whole list
+        is fetched again when the last full one is older than `full_every`.
+
+        :param full_every: seconds after which whole list is fetched `86400`
+        :param full: if True fetch whole list now
+        :param directory: where to store snapshots, see diskcache.cache_dir()
+        """
+        self.full_every = full_every
+        self.full = full
+        self.directory = os.path.join(directory or cache_dir(), "snapshots")
+
+    def path(self, host):
+        key = "\0".join([str(host.address), str(host.port), str(host.username)])
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, host):
+        """
+        Snapshot stored for the host or None.
+        """
+        try:
+            with open(self.path(host), "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(snapshot, dict) or "scans" not in snapshot:
+            return None
+
+        return snapshot
+
+    def set(self, host, snapshot):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self.path(host)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def since(self, snapshot):
+        """
+        Time from which changes are asked for, None if whole list is needed.
+        """
+        if self.full or snapshot is None or snapshot.get("timestamp") is None:
+            return None
+        if time.time() - snapshot.get("full_synced", 0) > self.full_every:
+            return None
+
+        return max(0, snapshot["timestamp"] - OVERLAP)
+
+
+def high_water_mark(response, scans):
+    """
+    Server time of the response, or the newest change if Nessus did not
+    send it.
+    """
+    if response.get("timestamp") is not None:
+        return response["timestamp"]
+
+    dates = [scan.get("last_modification_date") or 0 for scan in scans]
+    return max(dates, default=None)
+
+
+def merge(snapshot, response, since):
+    """
+    New snapshot from the previous one and `/scans` response.
+
+    Changed scans replace the stored ones in place, new ones are added at
+    the end, so the order stays stable between runs.
+    """
+    changed = response.get("scans") or []
+    if since is None:
+        return {
+            "timestamp": high_water_mark(response, changed),
+            "full_synced": time.time(),
+            "scans": changed,
+        }
+
+    scans = snapshot["scans"]
+    positions = {scan["id"]: position for position, scan in enumerate(scans)}
+    for scan in changed:
+        position = positions.get(scan["id"])
+        if position is None:
+            positions[scan["id"]] = len(scans)
+            scans.append(scan)
+        else:
+            scans[position] = scan
+
+    return {
+        "timestamp": high_water_mark(response, changed) or snapshot["timestamp"],
+        "full_synced": snapshot.get("full_synced", 0),
+        "scans": scans,
+    }
+
+
+def sync(snapshots, host, scans_changed_get):
+    """
+    Bring snapshot of the host up to date and return its scans.
+
+    :param snapshots: ScanSnapshots
+    :param host: fleet.Host
+    :param scans_changed_get: TnsApi.scans_changed_get of logged in host
+    :return: list of scans, None if there are none, like TnsApi.scans_get
+    """
+    snapshot = snapshots.get(host)
+    since = snapshots.since(snapshot)
+    snapshot = merge(snapshot, scans_changed_get(since), since)
+    snapshots.set(host, snapshot)
+
+    return snapshot["scans"] or None
+
+
+async def sync_async(snapshots, host, scans_changed_get):
+    """
+    Same as sync() with AsyncTnsApi.scans_changed_get.
+    """
+    snapshot = snapshots.get(host)
+    since = snapshots.since(snapshot)
+    snapshot = merge(snapshot, await scans_changed_get(since), since)
+    snapshots.set(host, snapshot)
+
+    return snapshot["scans"] or None
@@ -0,0 +1,49 @@
+import hashlib
+import json
+import os
+from tnscm.modules.diskcache import cache_dir
+
+
+class SessionStore:
+
+    def __init__(self, directory=None):
+        """
+        Keeps Nessus API session tokens between tnscm runs, one file per
+        address, port and user readable only by current OS user.
+
+        :param directory: where to store tokens, see diskcache.cache_dir()
+        """
+        self.directory = os.path.join(directory or cache_dir(), "sessions")
+
+    def path(self, host):
+        key = "\0".join([str(host.address), str(host.port), str(host.username)])
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, host):
+        """
+        Token stored for the host or None.
+        """
+        try:
+            with open(self.path(host), "r", encoding="utf-8") as f:
+                return json.load(f)["token"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, host, token):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self.path(host)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"address": host.address, "token": token}, f)
+        os.replace(tmp_path, path)
+
+    def delete(self, host):
+        """
+        Forget token of the host, e.g. when Nessus does not accept it.
+        """
+        try:
+            os.remove(self.path(host))
+        except OSError:
+            pass
@@ -0,0 +1,115 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tnscm.modules import filterplan
+from tnscm.modules import fleet
+from tnscm.modules import records
+from tnscm.modules import timestamps
+from tnscm.modules import tracing
+from tnscm.modules.results import Filtered
+
+# filter applied to data of TnsApi method before it is sent back
+Query = namedtuple(
+    "Query", ["method", "expression", "timestamp_fields", "raw_timestamps"]
+)
+
+
+def chunks_get(hosts, workers, parallel):
+    """
+    Hosts split into chunks of at most `parallel` hosts, so each worker
+    gets at least one chunk when there are enough hosts.
+    """
+    size = max(1, min(parallel, -(-len(hosts) // max(1, workers))))
+    return [hosts[start : start + size] for start in range(0, len(hosts), size)]
+
+
+def query_apply(query, data, host_timings=tracing.DISABLED):
+    data = records.unpack(data)
+
+    if query.timestamp_fields and not query.raw_timestamps:
+        with host_timings.phase("timestamps"):
+            fields = timestamps.fields_used(query.expression, query.timestamp_fields)
+            timestamps.normalize(data, fields)
+
+    with host_timings.phase("filter"):
+        return filterplan.compile(query.expression).search(data)
+
+
+def chunk_fetch(hosts, methods, parallel, queries, timed, options):
+    """
+    Fetch and filter data of one chunk of hosts, run in worker process.
+
+    :param queries: list of Query, data of other methods is sent as it is
+    :param timed: if True requests and phases of each host are recorded
+    :param options: more fleet.fetch() arguments
+    :return: list of (HostResult, requests, phases) in order of hosts
+    """
+    timings = tracing.Timings() if timed else None
+    done = []
+    for result in fleet.fetch(hosts, methods, parallel, timings=timings, **options):
+        host_timings = tracing.host_get(timings, result.host.address)
+        if result.error is None:
+            for query in queries:
+                data = result.data.get(query.method)
+                if data is not None:
+                    result.data[query.method] = Filtered(
+                        query_apply(query, data, host_timings)
+                    )
+        done.append((result, host_timings.requests, host_timings.phases))
+
+    return done
+
+
+def fetch(
+    hosts,
+    methods,
+    workers,
+    parallel=1,
+    queries=None,
+    ordered=True,
+    timings=None,
+    **options,
+):
+    """
+    Fetch data from many hosts in `workers` processes, so decoding and
+    filtering of large lists uses more than one CPU core.
+
+    Hosts are split into chunks, each process fetches one chunk at a time
+    with `parallel` hosts at the same time and sends back only filtered
+    data, as results.Filtered.
+
+    :param hosts: list of Host
+    :param methods: list of TnsApi method names to call on each host
+    :param workers: number of processes
+    :param parallel: number of hosts each process talks to at the same time
+    :param queries: list of Query applied in worker processes
+    :param ordered: if False yield results of chunks as they complete
+    :param timings: Timings, requests and phases recorded by processes
+                    are added to it
+    :param options: more fleet.fetch() arguments, except keep_session as
+                    session can't be used by other process
+    """
+    executor = ProcessPoolExecutor(max_workers=max(1, workers))
+    futures = [
+        executor.submit(
+            chunk_fetch,
+            chunk,
+            methods,
+            parallel,
+            queries or [],
+            timings is not None,
+            options,
+        )
+        for chunk in chunks_get(hosts, workers, parallel)
+    ]
+    try:
+        for future in futures if ordered else as_completed(futures):
+            for result, requests, phases in future.result():
+                if timings is not None:
+                    timings.host(result.host.address).extend(requests, phases)
+                yield result
+    except BaseException:
+        # output stopped or failed, chunks not started yet are not fetched
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    executor.shutdown(wait=True)
@@ -0,0 +1,110 @@
+import random
+import threading
+import time
+
+# response codes after which request is sent again
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# methods which can be sent again after error response, repeating them
+# does not change anything on the server
+RETRY_METHODS = ("GET", "HEAD")
+
+
+def retryable(method, resource):
+    """
+    True if request can be sent again after response from RETRY_STATUSES or
+    after connection broken during the exchange. Export request or delete
+    could be done twice, login only opens one more session.
+    """
+    return method in RETRY_METHODS or (method == "POST" and resource == "/session")
+
+
+class Retry:
+
+    def __init__(self, retries=0, backoff=0.5, max_backoff=30.0):
+        """
+        How many times and after how long failed request is sent again.
+
+        Delay before n-th retry is random between 0 and
+        `backoff * 2 ** n` seconds, at most `max_backoff`, so many clients
+        retrying at once do not hit the server at the same moment.
+
+        :param retries: number of retries after the first attempt `0`
+        :param backoff: base delay in seconds `0.5`
+        :param max_backoff: max delay in seconds `30`
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Seconds to wait before retry number `attempt` (starting from 0),
+        `Retry-After` given by server is respected up to max_backoff.
+        """
+        if retry_after is not None:
+            try:
+                return min(self.max_backoff, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+class Limiter:
+
+    def __init__(self, max_concurrency=None, max_rps=None):
+        """
+        Limits requests sent to one Nessus server.
+
+        :param max_concurrency: max number of requests in progress at once,
+                                None for no limit
+        :param max_rps: max number of requests started per second, evenly
+                        spaced, None for no limit
+        """
+        self.max_concurrency = max_concurrency
+        self.max_rps = max_rps
+        self._semaphore = (
+            threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        )
+        self._interval = 1.0 / max_rps if max_rps else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Reserve the next free start time.
+
+        :return: seconds to wait before request can be sent
+        """
+        if not self._interval:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self._interval
+
+        return start - now
+
+    def acquire(self):
+        """
+        Wait until request can be sent, release() must be called once it
+        is done.
+        """
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
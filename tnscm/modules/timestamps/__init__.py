@@ -0,0 +1,160 @@
+import time
+from tnscm import utilities
+
+np = utilities.lazy_import("numpy")
+jmespath_parser = utilities.lazy_import("jmespath.parser")
+
+
+SCAN_FIELDS = ["creation_date", "last_modification_date"]
+POLICY_FIELDS = ["creation_date", "last_modification_date"]
+USER_FIELDS = ["lastlogin"]
+DETAIL_FIELDS = ["scan_start", "scan_end", "last_modification_date"]
+HISTORY_FIELDS = ["creation_date", "last_modification_date"]
+
+DAY = 86400
+
+
+# nodes which give their input, or elements of it, as they are
+PASSING_NODES = ["identity", "current", "index", "slice"]
+# nodes which give only values out of their input, never the input itself
+NARROWING_NODES = ["field", "literal", "comparator", "not_expression"]
+# nodes which apply second child to output of the first one
+CHAINED_NODES = [
+    "subexpression",
+    "index_expression",
+    "pipe",
+    "projection",
+    "value_projection",
+    "filter_projection",
+]
+# functions which return numbers, booleans or strings, never items
+SCALAR_FUNCTIONS = [
+    "abs",
+    "avg",
+    "ceil",
+    "contains",
+    "ends_with",
+    "floor",
+    "join",
+    "keys",
+    "length",
+    "starts_with",
+    "sum",
+    "to_number",
+    "type",
+]
+
+
+def nodes_walk(node):
+    yield node
+    for child in node.get("children", []):
+        if isinstance(child, dict):
+            yield from nodes_walk(child)
+
+
+def items_passed(node):
+    """
+    True if output of the node can have whole items of its input, e.g.
+    `[? id == 1]` or `{rows: [*]}`, False if only values of their fields.
+    """
+    kind = node["type"]
+    children = [child for child in node.get("children", []) if isinstance(child, dict)]
+    if kind in PASSING_NODES:
+        return True
+    if kind in NARROWING_NODES:
+        return False
+    if kind in CHAINED_NODES:
+        # condition of filter projection is not part of output
+        return all(items_passed(child) for child in children[:2])
+    if kind == "flatten":
+        return items_passed(children[0])
+    if kind == "function_expression" and node.get("value") in SCALAR_FUNCTIONS:
+        return False
+    if not children:
+        return True
+
+    # multi select, or/and expression, expref and other functions
+    return any(items_passed(child) for child in children)
+
+
+def fields_used(expression, fields):
+    """
+    Fields out of given ones which JMESPath expression can return.
+
+    Fields are narrowed to names used in expression only if every path to
+    its output ends in named fields, e.g. `[].{id: id}`; expression which
+    can return whole items (e.g. `[]`, `[? id == 1]`, `{rows: [*]}`) uses
+    all fields.
+    """
+    try:
+        parsed = jmespath_parser.Parser().parse(expression).parsed
+    except Exception:
+        return list(fields)
+
+    if items_passed(parsed):
+        return list(fields)
+
+    names = {
+        node.get("value") for node in nodes_walk(parsed) if node["type"] == "field"
+    }
+    return [field for field in fields if field in names]
+
+
+def local_datetime_strings(epochs):
+    """
+    Convert list of epoch seconds to local `YYYY-MM-DD HH:MM:SS` strings at
+    once, same as str(datetime.datetime.fromtimestamp(epoch)).
+    """
+    seconds = np.floor(np.asarray(epochs, dtype="float64")).astype("int64")
+
+    # UTC offset is looked up once per day, values from days in which it
+    # changes (daylight saving time) are looked up one by one
+    days = seconds // DAY
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    day_offsets = {
+        int(day): time.localtime(int(day) * DAY).tm_gmtoff
+        for day in np.union1d(unique_days, unique_days + 1)
+    }
+    start = np.array([day_offsets[int(day)] for day in unique_days], dtype="int64")
+    end = np.array([day_offsets[int(day) + 1] for day in unique_days], dtype="int64")
+
+    offsets = start[day_index]
+    changing = np.nonzero((start != end)[day_index])[0]
+    offsets[changing] = [
+        time.localtime(int(second)).tm_gmtoff for second in seconds[changing]
+    ]
+
+    local = (seconds + offsets).astype("datetime64[s]")
+    strings = np.datetime_as_string(local, unit="s").tolist()
+    return [string.replace("T", " ") for string in strings]
+
+
+def normalize(items, fields):
+    """
+    Replace epoch values of given fields with local date and time strings,
+    column by column. Missing lastlogin (None) is treated as 0.
+    """
+    if not items or not fields:
+        return items
+
+    for field in fields:
+        positions = []
+        epochs = []
+        for position, item in enumerate(items):
+            if not isinstance(item, dict) or field not in item:
+                continue
+            value = item[field]
+            if value is None:
+                if field != "lastlogin":
+                    continue
+                value = 0
+            positions.append(position)
+            epochs.append(value)
+
+        if not epochs:
+            continue
+
+        for position, value in zip(positions, local_datetime_strings(epochs)):
+            items[position][field] = value
+
+    return items
@@ -1,18 +1,137 @@
 import requests
 import json
+import os
 import certstore
 import urllib3
-import sys
-import datetime
+import threading
+import time
+from tnscm.modules import apierrors
+from tnscm.modules import jsonstream
+from tnscm.modules import throttle
+
+
+def request_not_sent(error):
+    """
+    True if connection to Nessus API could not be opened, so request has not
+    been sent and sending it again can't repeat it.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def release_on_close(response, limiter):
+    """
+    Release limiter once streamed response is closed.
+    """
+    close = response.close
+    # taken by the first close only, response may be closed more than once
+    once = threading.Lock()
+
+    def close_release():
+        try:
+            close()
+        finally:
+            if once.acquire(blocking=False):
+                limiter.release()
+
+    response.close = close_release
+
+
+def proxy_get(host, port):
+    """
+    Proxy which requests uses for the host, from HTTPS_PROXY, ALL_PROXY and
+    NO_PROXY environment variables, None if it connects directly.
+    """
+    url = "https://{}:{}".format(host_format(host), port)
+    proxies = requests.utils.get_environ_proxies(url)
+    return proxies.get("https") or proxies.get("all")
+
+
+def host_format(host):
+    """
+    Host as written in URL or Host header, IPv6 address in brackets.
+    """
+    host = str(host)
+    if ":" in host and not host.startswith("["):
+        return "[{}]".format(host)
+
+    return host
+
+
+class PoolAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter which counts connections opened to Nessus API.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.connections_opened = 0
+        self._lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        class CountingHTTPSConnection(urllib3.connection.HTTPSConnection):
+            def connect(self):
+                super().connect()
+                adapter.connection_opened()
+
+        class CountingHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+            ConnectionCls = CountingHTTPSConnection
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": urllib3.HTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
 
 
 class TnsApi:
 
-    def __init__(self, host="127.0.0.1", port=443, insecure=None):
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=443,
+        insecure=None,
+        pool_size=10,
+        keep_alive=True,
+        memoize=True,
+        on_request=None,
+        retries=0,
+        max_concurrency=None,
+        max_rps=None,
+        timeout=None,
+    ):
         """
         :param host: address to Nessus API `127.0.0.1`
         :param port: port to Nessus API `443`
         :param insecure: if True perform insecure SSL connections and transfers
+        :param pool_size: max number of connections kept open to Nessus API `10`
+        :param keep_alive: if False close connection after each request
+        :param memoize: if True repeated GET of the same resource is answered
+                        from memory until any POST, PUT or DELETE is sent
+        :param on_request: function called after each request sent to Nessus
+                           API with method, resource, status code (None if
+                           request failed), response size in bytes and
+                           duration in seconds
+        :param retries: number of times request is sent again after
+                        connection error or response code 429, 500, 502,
+                        503 or 504, with exponential backoff and jitter `0`;
+                        only GET and login are sent again after response or
+                        broken connection, others only if connection could
+                        not be opened
+        :param max_concurrency: max number of requests sent to Nessus API
+                                at the same time, None for no limit
+        :param max_rps: max number of requests sent to Nessus API per
+                        second, None for no limit
+        :param timeout: seconds to wait for connection to open and for each
+                        read from Nessus API, None for no limit
         """
         self.host = host
         self.port = port
@@ -26,48 +145,162 @@ class TnsApi:
 
         self._token = ""
 
+        self.memoize = memoize
+        self._responses = {}
+
+        self.timeout = timeout
+
+        self.on_request = on_request
+        self.retry = throttle.Retry(retries)
+        self.limiter = throttle.Limiter(max_concurrency, max_rps)
+
+        self._requests_sent = 0
+        self._lock = threading.Lock()
+        self._adapter = PoolAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def close(self):
+        """
+        Close all pooled connections to Nessus API.
+        """
+        self.session.close()
+
+    def connection_stats(self):
+        """
+        Number of connections opened to Nessus API and number of requests
+        which reused already opened connection.
+        """
+        opened = self._adapter.connections_opened
+        requests_sent = self._requests_sent
+
+        return {
+            "opened": opened,
+            "reused": max(0, requests_sent - opened),
+            "requests": requests_sent,
+        }
+
+    def cache_clear(self):
+        """
+        Forget all memoized GET responses.
+        """
+        with self._lock:
+            self._responses.clear()
+
     def build_url(self, resource):
         url = "{}://{}:{}".format("https", self.host, self.port)
         return "{}{}".format(url, resource)
 
-    def connect(self, method, resource, data=None):
+    def send(self, method, resource, data=None, stream=False):
+        """
+        Send request to Nessus API and return response whatever its status is.
+
+        Request is sent again after connection error or response code from
+        throttle.RETRY_STATUSES as many times as `retries` allows, last
+        response or error is returned or raised. Requests which are not
+        throttle.retryable() are sent again only if connection could not be
+        opened, so e.g. export is not requested twice.
+
+        :param stream: if True body is not read, on_request is left to caller
+        """
+        data = json.dumps(data)
+        retryable = throttle.retryable(method, resource)
+
+        attempt = 0
+        while True:
+            try:
+                r = self.send_once(method, resource, data, stream)
+            except requests.exceptions.SSLError:
+                # certificate problems do not go away by retrying
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.retry.retries or not (
+                    retryable or request_not_sent(e)
+                ):
+                    raise
+                delay = self.retry.delay(attempt)
+            else:
+                if (
+                    r.status_code not in throttle.RETRY_STATUSES
+                    or attempt >= self.retry.retries
+                    or not retryable
+                ):
+                    return r
+                delay = self.retry.delay(attempt, r.headers.get("Retry-After"))
+                r.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def send_once(self, method, resource, data, stream=False):
+        """
+        Send one request with already encoded data, within limits.
 
+        Streamed response keeps its place in max_concurrency until it is
+        closed, e.g. by `with` block.
+        """
         headers = {
             "X-Cookie": "token={0}".format(self._token),
             "content-type": "application/json",
         }
 
-        data = json.dumps(data)
+        with self._lock:
+            self._requests_sent += 1
 
-        if method == "POST":
-            r = requests.post(
-                self.build_url(resource), data=data, headers=headers, verify=self.verify
-            )
-        elif method == "PUT":
-            r = requests.put(
-                self.build_url(resource), data=data, headers=headers, verify=self.verify
-            )
-        elif method == "DELETE":
-            r = requests.delete(
-                self.build_url(resource), data=data, headers=headers, verify=self.verify
+        self.limiter.acquire()
+        # time spent waiting for the limiter is not request latency
+        start = time.perf_counter()
+        try:
+            r = self.session.request(
+                method,
+                self.build_url(resource),
+                data=data,
+                headers=headers,
+                verify=self.verify,
+                stream=stream,
+                timeout=self.timeout,
             )
+        except BaseException:
+            self.limiter.release()
+            if self.on_request is not None and not stream:
+                self.on_request(method, resource, None, 0, time.perf_counter() - start)
+            raise
+
+        if stream:
+            # body is still being read, request is in progress until closed
+            release_on_close(r, self.limiter)
         else:
-            r = requests.get(
-                self.build_url(resource), data=data, headers=headers, verify=self.verify
+            self.limiter.release()
+
+        if self.on_request is not None and not stream:
+            self.on_request(
+                method,
+                resource,
+                r.status_code,
+                len(r.content),
+                time.perf_counter() - start,
             )
+        return r
 
-        if r.status_code == 401:
-            print("Response code: {}".format(r.status_code))
-            print("Unauthorized.")
-            sys.exit()
-        if r.status_code == 500:
-            print("Response code: {}".format(r.status_code))
-            print("Internal Server Error.")
-            sys.exit()
-        if r.status_code == 503:
-            print("Response code: {}".format(r.status_code))
-            print("Service Unavailable.")
-            sys.exit()
+    def connect(self, method, resource, data=None, memoize=True):
+
+        memoizable = (
+            self.memoize and memoize and method == "GET" and "download" not in resource
+        )
+        if memoizable:
+            with self._lock:
+                content = self._responses.get(resource)
+            if content is not None:
+                # decoded again, so callers can modify what they get
+                return json.loads(content)
+        elif method != "GET":
+            self.cache_clear()
+
+        r = self.send(method, resource, data)
+
+        apierrors.check(r.status_code, resource)
 
         if method == "POST":
             return r.json()
@@ -80,7 +313,44 @@ class TnsApi:
             if "download" in resource:
                 return r.content
             else:
-                return r.json()
+                data = r.json()
+                if memoizable and r.ok:
+                    with self._lock:
+                        self._responses[resource] = r.content
+                return data
+
+    def connect_stream(self, resource, key, chunk_size=64 * 1024):
+        """
+        GET list and decode its items one by one while response is read,
+        so the whole body and the whole list are never kept in memory.
+
+        Request is sent when the first item is taken from the generator,
+        errors are raised from there too.
+
+        :param key: name of the list in response, e.g. `scans`
+        :return: generator of items, empty if Nessus returned null
+        """
+        start = time.perf_counter()
+        size = 0
+        status_code = None
+
+        def chunks(r):
+            nonlocal size
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                size += len(chunk)
+                yield chunk
+
+        try:
+            with self.send("GET", resource, stream=True) as r:
+                status_code = r.status_code
+                apierrors.check(r.status_code, resource)
+                r.raise_for_status()
+                yield from jsonstream.array_items(chunks(r), key)
+        finally:
+            if self.on_request is not None:
+                self.on_request(
+                    "GET", resource, status_code, size, time.perf_counter() - start
+                )
 
     def login(self, usr, pwd):
         """
@@ -92,6 +362,19 @@ class TnsApi:
         self._token = data["token"]
         return self._token
 
+    def session_resume(self, token):
+        """
+        Use token of session opened earlier, if Nessus still accepts it.
+
+        :return: True if session is valid, False if login is needed
+        """
+        self._token = token
+        if self.send("GET", "/session").ok:
+            return True
+
+        self._token = ""
+        return False
+
     def logout(self):
         """
         Logout of Nessus.
@@ -99,7 +382,7 @@ class TnsApi:
         self.connect("DELETE", "/session")
 
     def session_get(self):
-        data = self.connect("GET", "/session")
+        data = self.connect("GET", "/session", memoize=False)
         return data
 
     def server_status_get(self):
@@ -110,7 +393,12 @@ class TnsApi:
         data = self.connect("GET", "/server/properties")
         return data
 
-    def policies_get(self):
+    def policies_get(self, stream=False):
+        """
+        :param stream: if True return generator decoding policies one by one
+        """
+        if stream:
+            return self.connect_stream("/policies", "policies")
         data = self.connect("GET", "/policies")["policies"]
         return data
 
@@ -118,7 +406,12 @@ class TnsApi:
         data = self.connect("DELETE", "/policies/{0}".format(id))
         return data
 
-    def users_get(self):
+    def users_get(self, stream=False):
+        """
+        :param stream: if True return generator decoding users one by one
+        """
+        if stream:
+            return self.connect_stream("/users", "users")
         data = self.connect("GET", "/users")["users"]
         return data
 
@@ -126,14 +419,96 @@ class TnsApi:
         data = self.connect("GET", "/folders")
         return data
 
-    def scans_get(self):
+    def scans_get(self, stream=False):
+        """
+        :param stream: if True return generator decoding scans one by one
+        """
+        if stream:
+            return self.connect_stream("/scans", "scans")
         data = self.connect("GET", "/scans")["scans"]
         return data
 
+    def scans_changed_get(self, last_modification_date=None):
+        """
+        Whole `/scans` response, only with scans changed since given time.
+
+        :param last_modification_date: epoch seconds, all scans if None
+        :return: dict with `scans` (None if nothing changed), `folders` and
+                 server `timestamp`
+        """
+        resource = "/scans"
+        if last_modification_date is not None:
+            resource = "/scans?last_modification_date={0}".format(
+                int(last_modification_date)
+            )
+        data = self.connect("GET", resource)
+        return data
+
+    def scan_details_get(self, id):
+        data = self.connect("GET", "/scans/{0}".format(id))
+        return data
+
     def scan_delete(self, id):
         data = self.connect("DELETE", "/scans/{0}".format(id))
         return data
 
+    def scan_export_request(self, scan_id, format, chapters=None):
+        """
+        Ask Nessus to prepare scan export.
+
+        :param format: `nessus`, `csv` or `html`
+        :param chapters: report chapters, required by Nessus for `html`
+        :return: dict with file id and token
+        """
+        export = {"format": format}
+        if chapters:
+            export["chapters"] = chapters
+        data = self.connect("POST", "/scans/{0}/export".format(scan_id), data=export)
+        return data
+
+    def scan_export_status(self, scan_id, file_id):
+        data = self.connect(
+            "GET",
+            "/scans/{0}/export/{1}/status".format(scan_id, file_id),
+            memoize=False,
+        )["status"]
+        return data
+
+    def scan_export_download(self, scan_id, file_id, path, chunk_size=1024 * 1024):
+        """
+        Download prepared scan export to file, chunk by chunk, so the whole
+        file is never kept in memory. File appears under given path only
+        when download is complete.
+
+        :return: number of bytes written
+        """
+        resource = "/scans/{0}/export/{1}/download".format(scan_id, file_id)
+        start = time.perf_counter()
+        size = 0
+        status_code = None
+        part_path = "{}.part".format(path)
+        try:
+            with self.send("GET", resource, stream=True) as r:
+                status_code = r.status_code
+                apierrors.check(r.status_code, resource)
+                r.raise_for_status()
+                with open(part_path, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(part_path, path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        finally:
+            if self.on_request is not None:
+                self.on_request(
+                    "GET", resource, status_code, size, time.perf_counter() - start
+                )
+
+        return size
+
     def plugins_families_get(self):
         data = self.connect("GET", "/plugins/families")["families"]
         return data
@@ -0,0 +1,139 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class HostTimings:
+
+    def __init__(self, address, enabled=True):
+        """
+        Requests sent to one host and time spent in each phase of work
+        with its data, e.g. login, fetch, filter, render.
+
+        :param address: address of the host
+        :param enabled: if False nothing is recorded
+        """
+        self.address = address
+        self.enabled = enabled
+        self.requests = []
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, resource, status_code, size, seconds):
+        """
+        Record one request, signature matches `on_request` of TnsApi.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.requests.append(
+                {
+                    "method": method,
+                    "resource": resource,
+                    "status": status_code,
+                    "bytes": size,
+                    "seconds": round(seconds, 6),
+                }
+            )
+
+    def phase_add(self, name, seconds):
+        with self._lock:
+            phase = self.phases.setdefault(name, {"seconds": 0.0, "count": 0})
+            phase["seconds"] += seconds
+            phase["count"] += 1
+
+    def extend(self, requests, phases):
+        """
+        Add requests and phases recorded for the host by other process.
+        """
+        with self._lock:
+            self.requests.extend(requests)
+            for name, phase in phases.items():
+                total = self.phases.setdefault(name, {"seconds": 0.0, "count": 0})
+                total["seconds"] += phase["seconds"]
+                total["count"] += phase["count"]
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure time of the `with` block as given phase, time of the same
+        phase repeated for the host is summed up.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_add(name, time.perf_counter() - start)
+
+    def summary(self):
+        with self._lock:
+            requests = list(self.requests)
+            phases = {
+                name: {"seconds": round(phase["seconds"], 6), "count": phase["count"]}
+                for name, phase in self.phases.items()
+            }
+
+        return {
+            "host": self.address,
+            "phases": phases,
+            "requests": requests,
+            "requests_count": len(requests),
+            "requests_seconds": round(
+                sum(request["seconds"] for request in requests), 6
+            ),
+            "requests_bytes": sum(request["bytes"] for request in requests),
+        }
+
+
+DISABLED = HostTimings(None, enabled=False)
+
+
+class Timings:
+
+    def __init__(self):
+        """
+        Timings of all hosts talked to in one tnscm run.
+        """
+        self.start = time.perf_counter()
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def host(self, address):
+        with self._lock:
+            if address not in self.hosts:
+                self.hosts[address] = HostTimings(address)
+            return self.hosts[address]
+
+    def summary(self):
+        with self._lock:
+            hosts = list(self.hosts.values())
+
+        return {
+            "seconds": round(time.perf_counter() - self.start, 6),
+            "hosts": [host.summary() for host in hosts],
+        }
+
+    def dump(self, stream=None):
+        """
+        Write summary as one line of JSON, to stderr by default so it does
+        not mix with data written to stdout.
+        """
+        stream = stream or sys.stderr
+        stream.write(json.dumps(self.summary()))
+        stream.write("\n")
+        stream.flush()
+
+
+def host_get(timings, address):
+    """
+    HostTimings of the address, DISABLED one if timings is None.
+    """
+    if timings is None:
+        return DISABLED
+
+    return timings.host(address)
@@ -0,0 +1,202 @@
+import csv
+import json
+import sys
+
+FORMATS = ["table", "json", "csv", "ndjson"]
+
+
+def rows_get(data):
+    """
+    Rows of JMESPath result, a single object or value is treated as one row.
+    """
+    if data is None:
+        return []
+    if isinstance(data, list):
+        return data
+
+    return [data]
+
+
+def host_rows(host, data):
+    """
+    Rows of JMESPath result with `host` column added as the first one.
+    """
+    for row in rows_get(data):
+        if isinstance(row, dict):
+            merged = {"host": host}
+            merged.update((key, value) for key, value in row.items() if key != "host")
+            yield merged
+        elif isinstance(row, list):
+            yield [host] + row
+        else:
+            yield {"host": host, "value": row}
+
+
+def value_dump(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+
+    return value
+
+
+def fieldnames_get(rows):
+    """
+    Ordered union of keys of dict rows and indexes of list rows.
+    """
+    fieldnames = {}
+    for row in rows:
+        if isinstance(row, dict):
+            fieldnames.update(dict.fromkeys(row))
+        elif isinstance(row, list):
+            fieldnames.update(dict.fromkeys(range(len(row))))
+        else:
+            fieldnames[0] = None
+    return list(fieldnames)
+
+
+class CsvWriter:
+
+    def __init__(self, stream=None):
+        """
+        Writes rows as CSV with union of keys of all rows as header.
+
+        Rows are kept until close(), unless keys of every row are given to
+        write_rows(), then they are written as they come.
+
+        :param stream: file like object `sys.stdout`
+        """
+        self.stream = stream or sys.stdout
+        self.writer = csv.writer(self.stream, lineterminator="\n")
+        self.fieldnames = None
+        self.known = set()
+        self.rows = []
+
+    def write_rows(self, rows, fieldnames=None):
+        """
+        :param fieldnames: keys of every dict row if they are known in
+                           advance, e.g. from filterplan.fields_get()
+        """
+        if self.fieldnames is None and fieldnames is not None and not self.rows:
+            self.header_write(fieldnames)
+        if self.fieldnames is None:
+            self.rows.extend(rows)
+            return
+
+        for row in rows:
+            self.row_write(row)
+
+    def header_write(self, fieldnames):
+        self.fieldnames = list(fieldnames)
+        self.known = set(self.fieldnames)
+        self.writer.writerow(self.fieldnames)
+
+    def row_write(self, row):
+        if isinstance(row, dict):
+            values = [row.get(fieldname) for fieldname in self.fieldnames]
+            dropped = set(row) - self.known
+            if dropped:
+                # header is already written, data must not go missing unnoticed
+                sys.stderr.write(
+                    "CSV header has no column for {}, values are left out\n".format(
+                        ", ".join(sorted(map(str, dropped)))
+                    )
+                )
+                self.known.update(dropped)
+        elif isinstance(row, list):
+            values = row
+        else:
+            values = [row]
+
+        self.writer.writerow([value_dump(value) for value in values])
+
+    def close(self):
+        if self.fieldnames is None and self.rows:
+            self.header_write(fieldnames_get(self.rows))
+            for row in self.rows:
+                self.row_write(row)
+            self.rows = []
+        self.stream.flush()
+
+
+class JsonWriter:
+
+    def __init__(self, stream=None):
+        """
+        Writes rows as one JSON array, element by element.
+
+        :param stream: file like object `sys.stdout`
+        """
+        self.stream = stream or sys.stdout
+        self.count = 0
+
+    def write_rows(self, rows, fieldnames=None):
+        for row in rows:
+            self.stream.write("[\n" if self.count == 0 else ",\n")
+            self.stream.write(json.dumps(row, default=str))
+            self.count += 1
+
+    def close(self):
+        self.stream.write("[]\n" if self.count == 0 else "\n]\n")
+        self.stream.flush()
+
+
+class NdjsonWriter:
+
+    def __init__(self, stream=None):
+        """
+        Writes rows as newline delimited JSON, one row per line.
+
+        :param stream: file like object `sys.stdout`
+        """
+        self.stream = stream or sys.stdout
+
+    def write_rows(self, rows, fieldnames=None):
+        for row in rows:
+            self.stream.write(json.dumps(row, default=str))
+            self.stream.write("\n")
+
+    def close(self):
+        self.stream.flush()
+
+
+class ListWriter:
+
+    def __init__(self):
+        """
+        Keeps rows in memory, for formats which need all of them at once.
+        """
+        self.rows = []
+
+    def write_rows(self, rows, fieldnames=None):
+        self.rows.extend(rows)
+
+    def close(self):
+        pass
+
+
+def writer_get(format, stream=None):
+    if format == "csv":
+        return CsvWriter(stream)
+    if format == "json":
+        return JsonWriter(stream)
+    if format == "ndjson":
+        return NdjsonWriter(stream)
+
+    raise ValueError("Unsupported format: {}".format(format))
+
+
+def write(data, format, stream=None):
+    """
+    Write JMESPath result in given format without building whole output
+    in memory.
+    """
+    if format == "json" and not isinstance(data, list):
+        # single object or value is written as it is, not as array
+        stream = stream or sys.stdout
+        stream.write(json.dumps(data, default=str))
+        stream.write("\n")
+        return
+
+    writer = writer_get(format, stream)
+    writer.write_rows(rows_get(data))
+    writer.close()
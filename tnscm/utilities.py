@@ -1,11 +1,30 @@
-import requests
-from packaging import version
+import importlib.util
+import sys
 from tnscm._version import __version__ as current_version
 from tnscm import __about__
 
 
+def lazy_import(name):
+    """
+    Import module on first access to any of its attributes.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
 def check_for_update():
 
+    import requests
+    from packaging import version
+
     PACKAGE_NAME = __about__.__package_name__
 
     try: